@@ -0,0 +1,98 @@
+import os
+import time
+import zipfile
+from typing import Iterator, List, NamedTuple, Optional
+from . import compression, metrics
+from .storage import CHUNK_SIZE
+
+# ZIP со всеми вложениями задачи, собираемый на лету. zipfile пишет в
+# объект без seek (размеры и CRC уходят в data descriptor после данных),
+# поэтому в памяти лежит не больше одного прочитанного блока и архив не
+# сохраняется во временный файл
+
+# Форматы, которые уже сжаты: повторное сжатие только тратит CPU
+STORED_EXTENSIONS = compression.COMPRESSED_EXTENSIONS
+_MIN_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+
+
+class Entry(NamedTuple):
+    path: str
+    name: str
+    # Кодек файла на диске и исходный размер (для сжатых файлов)
+    encoding: Optional[str] = None
+    size: Optional[int] = None
+
+
+class _Sink:
+    # Приёмник без seek/tell: zipfile переходит в потоковый режим
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def archive_names(filenames: List[str]) -> List[str]:
+    # Одинаковые имена в архиве получают суффикс: отчёт (2).xlsx
+    seen = set()
+    names = []
+    for filename in filenames:
+        name = filename
+        stem, extension = os.path.splitext(filename)
+        index = 2
+        while name in seen:
+            name = f"{stem} ({index}){extension}"
+            index += 1
+        seen.add(name)
+        names.append(name)
+    return names
+
+
+def _zip_info(entry: Entry) -> zipfile.ZipInfo:
+    stat = os.stat(entry.path)
+    date_time = max(time.localtime(stat.st_mtime)[:6], _MIN_DATE_TIME)
+    info = zipfile.ZipInfo(entry.name, date_time=date_time)
+    # Размер известен заранее: zipfile сам решит, нужен ли ZIP64
+    info.file_size = entry.size if entry.size is not None else stat.st_size
+    if os.path.splitext(entry.name)[1].lower() in STORED_EXTENSIONS:
+        info.compress_type = zipfile.ZIP_STORED
+    else:
+        info.compress_type = zipfile.ZIP_DEFLATED
+    return info
+
+
+def iter_zip(entries: List[Entry]) -> Iterator[bytes]:
+    # Синхронный генератор: StreamingResponse гоняет его в пуле потоков,
+    # чтение с диска и сжатие не блокируют event loop
+    sink = _Sink()
+    started = time.perf_counter()
+    sent = 0
+    try:
+        with zipfile.ZipFile(sink, "w") as archive:
+            for entry in entries:
+                with compression.open_stored(entry.path, entry.encoding) as source, \
+                        archive.open(_zip_info(entry), "w") as target:
+                    while chunk := source.read(CHUNK_SIZE):
+                        target.write(chunk)
+                        data = sink.drain()
+                        if data:
+                            sent += len(data)
+                            yield data
+                data = sink.drain()
+                if data:
+                    sent += len(data)
+                    yield data
+        data = sink.drain()
+        sent += len(data)
+        yield data
+    finally:
+        metrics.record_transfer("download", sent, time.perf_counter() - started)
@@ -0,0 +1,123 @@
+import codecs
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+# Формат строк массового импорта/экспорта задач (NDJSON и CSV)
+CSV_FIELDS = [
+    "id", "title", "description", "priority", "status",
+    "start_date", "end_date", "deadline", "created_at", "tags",
+]
+CSV_TAG_SEPARATOR = ";"
+
+Row = Tuple[int, Optional[Dict[str, Any]], Optional[str]]
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, str]]:
+    # Разбиваем поток тела запроса на строки, не читая его целиком
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    buffer = ""
+    line_no = 0
+    async for chunk in chunks:
+        buffer += decoder.decode(chunk)
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            line_no += 1
+            yield line_no, line.rstrip("\r")
+    buffer += decoder.decode(b"", final=True)
+    if buffer:
+        yield line_no + 1, buffer.rstrip("\r")
+
+
+async def iter_ndjson(chunks: AsyncIterator[bytes]) -> AsyncIterator[Row]:
+    async for line_no, line in iter_lines(chunks):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as exc:
+            yield line_no, None, f"Invalid JSON: {exc}"
+            continue
+        if not isinstance(row, dict):
+            yield line_no, None, "Expected a JSON object"
+            continue
+        yield line_no, row, None
+
+
+async def iter_csv(chunks: AsyncIterator[bytes]) -> AsyncIterator[Row]:
+    header = None
+    record = ""
+    record_line = 0
+    async for line_no, line in iter_lines(chunks):
+        if not record:
+            record_line = line_no
+            record = line
+        else:
+            record += "\n" + line
+        # Поле в кавычках может содержать перевод строки: ждём закрывающую кавычку
+        if record.count('"') % 2:
+            continue
+
+        values = next(csv.reader([record]), [])
+        record = ""
+        if not any(values):
+            continue
+        if header is None:
+            header = [name.strip() for name in values]
+            continue
+        if len(values) != len(header):
+            yield record_line, None, f"Expected {len(header)} columns, got {len(values)}"
+            continue
+        yield record_line, _csv_row(dict(zip(header, values))), None
+
+    if record:
+        yield record_line, None, "Unterminated quoted field"
+
+
+def _csv_row(values: Dict[str, str]) -> Dict[str, Any]:
+    # Пустые ячейки не передаём, чтобы сработали значения по умолчанию схемы
+    row = {key: value for key, value in values.items() if value != ""}
+    if "tags" in row:
+        row["tags"] = [tag.strip() for tag in row["tags"].split(CSV_TAG_SEPARATOR)
+                       if tag.strip()]
+    return row
+
+
+def _iso(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value else None
+
+
+def export_row(task, tags: List[str]) -> Dict[str, Any]:
+    return {
+        "id": task.id,
+        "title": task.title,
+        "description": task.description,
+        "priority": task.priority.value if task.priority else None,
+        "status": task.status.value if task.status else None,
+        "start_date": _iso(task.start_date),
+        "end_date": _iso(task.end_date),
+        "deadline": _iso(task.deadline),
+        "created_at": _iso(task.created_at),
+        "tags": tags,
+    }
+
+
+def to_ndjson(rows: List[Dict[str, Any]]) -> str:
+    return "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows)
+
+
+def csv_header() -> str:
+    return to_csv([dict(zip(CSV_FIELDS, CSV_FIELDS))])
+
+
+def to_csv(rows: List[Dict[str, Any]]) -> str:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=CSV_FIELDS, lineterminator="\n")
+    for row in rows:
+        if isinstance(row.get("tags"), list):
+            row = {**row, "tags": CSV_TAG_SEPARATOR.join(row["tags"])}
+        writer.writerow({key: "" if value is None else value
+                         for key, value in row.items()})
+    return buffer.getvalue()
@@ -0,0 +1,138 @@
+import json
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, List, Optional
+from .config import settings
+
+# Кэш сериализованных schemas.Task для GET /tasks/{id} и /tasks/{id}/files.
+# Инвалидируется из crud после каждой записи, затрагивающей задачу.
+
+
+class LocalBackend:
+    # LRU с TTL в памяти процесса
+    name = "local"
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+
+    async def get(self, key: str) -> Optional[dict]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, payload = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return payload
+
+    async def set(self, key: str, payload: dict):
+        self._entries[key] = (time.monotonic() + self.ttl, payload)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    async def delete(self, *keys: str):
+        for key in keys:
+            self._entries.pop(key, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RedisBackend:
+    # Общий кэш для нескольких воркеров: инвалидация видна всем процессам
+    name = "redis"
+
+    def __init__(self, url: str, ttl: float):
+        try:
+            import redis.asyncio as redis
+        except ImportError as exc:
+            raise RuntimeError(
+                "TASK_CACHE_URL requires the 'redis' package") from exc
+        self.ttl = ttl
+        self._client = redis.from_url(url)
+
+    async def get(self, key: str) -> Optional[dict]:
+        value = await self._client.get(key)
+        return json.loads(value) if value is not None else None
+
+    async def set(self, key: str, payload: dict):
+        await self._client.set(
+            key, json.dumps(payload, ensure_ascii=False), px=int(self.ttl * 1000))
+
+    async def delete(self, *keys: str):
+        if keys:
+            await self._client.delete(*keys)
+
+    def __len__(self):
+        return 0
+
+
+class TaskCache:
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        # Счётчик инвалидаций: не кладём в кэш данные, прочитанные до записи
+        self._generation = 0
+
+    @staticmethod
+    def _key(task_id: int) -> str:
+        return f"task:{task_id}"
+
+    async def get_or_load(
+        self,
+        task_id: int,
+        loader: Callable[[], Awaitable[Optional[dict]]]
+    ) -> Optional[dict]:
+        payload = await self.backend.get(self._key(task_id))
+        if payload is not None:
+            self.hits += 1
+            return payload
+
+        self.misses += 1
+        generation = self._generation
+        payload = await loader()
+        if payload is not None and generation == self._generation:
+            await self.backend.set(self._key(task_id), payload)
+        return payload
+
+    async def prime(self, loader: Callable[[], Awaitable[List[dict]]]):
+        # Прогрев при старте. Поколение берётся до чтения базы, как в
+        # get_or_load: запись, успевшая произойти, важнее прогрева. Общий
+        # кэш не прогреваем: он переживает перезапуск воркера, а записи
+        # других воркеров по локальному поколению не видны
+        if self.backend.name != LocalBackend.name:
+            return
+        generation = self._generation
+        payloads = await loader()
+        for payload in payloads:
+            if generation != self._generation:
+                return
+            await self.backend.set(self._key(payload["id"]), payload)
+
+    async def invalidate(self, *task_ids: int):
+        self._generation += 1
+        await self.backend.delete(*(self._key(task_id) for task_id in task_ids))
+
+    def stats(self) -> dict:
+        requests = self.hits + self.misses
+        return {
+            "backend": self.backend.name,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / requests if requests else 0.0,
+            "size": len(self.backend),
+        }
+
+
+def _create_backend():
+    if settings.task_cache_url:
+        return RedisBackend(settings.task_cache_url, settings.task_cache_ttl)
+    return LocalBackend(settings.task_cache_size, settings.task_cache_ttl)
+
+
+task_cache = TaskCache(_create_backend())
@@ -0,0 +1,70 @@
+import gzip
+import os
+import zlib
+from typing import BinaryIO, Optional
+
+# Сжатие вложений на диске (FILE_COMPRESSION=gzip|zstd). Кодек выбирается
+# для каждого файла: уже сжатые форматы хранятся как есть, а сжатый блоб
+# остаётся, только если он заметно меньше исходного. Кодек записывается в
+# TaskFile.encoding; модуль без зависимостей от приложения, потому что
+# используется и в процессах обработки (app/processors.py).
+
+GZIP = "gzip"
+ZSTD = "zstd"
+CODECS = (GZIP, ZSTD)
+# Суффикс файла блоба: один sha256 — один файл на диске, кодек виден по имени
+SUFFIXES = {None: "", GZIP: ".gz", ZSTD: ".zst"}
+
+# Форматы, которые уже сжаты: повторное сжатие только тратит CPU
+COMPRESSED_EXTENSIONS = {
+    ".xlsx", ".xlsm", ".docx", ".pptx", ".odt", ".ods", ".zip", ".gz", ".bz2",
+    ".xz", ".zst", ".7z", ".rar", ".jpg", ".jpeg", ".png", ".gif", ".webp",
+    ".mp3", ".mp4", ".mov", ".pdf",
+}
+# Сжатый блоб сохраняется, если он не больше этой доли исходного размера
+MAX_RATIO = 0.9
+
+
+def _zstandard():
+    # Необязательная зависимость: pip install my-tracker[zstd]
+    try:
+        import zstandard
+    except ImportError as exc:
+        raise RuntimeError("FILE_COMPRESSION=zstd requires the 'zstandard' package") from exc
+    return zstandard
+
+
+def check(setting: str) -> Optional[str]:
+    # Значение FILE_COMPRESSION проверяется при старте, а не на каждой загрузке
+    if setting == "off":
+        return None
+    if setting not in CODECS:
+        raise RuntimeError(
+            f"Unknown FILE_COMPRESSION {setting!r}, expected off, {', '.join(CODECS)}")
+    if setting == ZSTD:
+        _zstandard()
+    return setting
+
+
+def choose(filename: str, codec: Optional[str]) -> Optional[str]:
+    if codec not in CODECS:
+        return None
+    if os.path.splitext(filename)[1].lower() in COMPRESSED_EXTENSIONS:
+        return None
+    return codec
+
+
+def compressor(encoding: str):
+    # Объект с compress(chunk) и flush(), пишущий полный gzip/zstd-поток
+    if encoding == GZIP:
+        return zlib.compressobj(6, zlib.DEFLATED, 31)
+    return _zstandard().ZstdCompressor(level=3).compressobj()
+
+
+def open_stored(path: str, encoding: Optional[str]) -> BinaryIO:
+    # Исходное содержимое блоба, распаковываемое по мере чтения
+    if encoding is None:
+        return open(path, "rb")
+    if encoding == GZIP:
+        return gzip.open(path, "rb")
+    return _zstandard().ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
@@ -0,0 +1,75 @@
+import os
+from typing import Optional
+
+
+def _env(name: str, default: str) -> str:
+    return os.getenv(name, default)
+
+
+def _env_optional(name: str) -> Optional[str]:
+    return os.getenv(name) or None
+
+
+class Settings:
+    # Все настройки приложения задаются переменными окружения
+    def __init__(self):
+        # База данных: sqlite+aiosqlite:///... или postgresql+asyncpg://...
+        self.database_url = _env("DATABASE_URL", "sqlite+aiosqlite:///./database.db")
+        self.db_echo = _env("DB_ECHO", "false").lower() in ("1", "true", "yes")
+
+        # Схема при старте: check | create | off (см. app/schema.py)
+        self.schema_mode = _env("SCHEMA_MODE", "check").lower()
+        # Сколько коннектов каждого пула открыть при старте
+        self.db_pool_warmup = int(_env("DB_POOL_WARMUP", "2"))
+
+        # Профиль SQLite: один пишущий коннект, несколько читающих
+        self.sqlite_read_pool_size = int(_env("SQLITE_READ_POOL_SIZE", "8"))
+        self.sqlite_busy_timeout = int(_env("SQLITE_BUSY_TIMEOUT", "5000"))  # мс
+        self.sqlite_cache_size = int(_env("SQLITE_CACHE_SIZE", "-65536"))  # 64 МБ
+        self.sqlite_mmap_size = int(_env("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+
+        # Профиль PostgreSQL (asyncpg). Писатели работают параллельно, поэтому
+        # лента /tasks/changes там не гарантирует полноты (crud.get_changes)
+        self.db_pool_size = int(_env("DB_POOL_SIZE", "10"))
+        self.db_max_overflow = int(_env("DB_MAX_OVERFLOW", "20"))
+        self.db_pool_timeout = float(_env("DB_POOL_TIMEOUT", "30"))
+        self.db_pool_recycle = int(_env("DB_POOL_RECYCLE", "1800"))
+
+        # Кэш ответов GET /tasks/{id}
+        self.task_cache_size = int(_env("TASK_CACHE_SIZE", "1024"))
+        self.task_cache_ttl = float(_env("TASK_CACHE_TTL", "30"))
+        # Общий кэш для нескольких воркеров, например redis://localhost:6379/0
+        self.task_cache_url = _env_optional("TASK_CACHE_URL")
+        # Сколько последних изменённых задач положить в кэш при старте
+        self.task_cache_warmup = int(_env("TASK_CACHE_WARMUP", "0"))
+
+        # Журнал медленных запросов с SQL; 0 — выключен
+        self.slow_request_ms = float(_env("SLOW_REQUEST_MS", "0"))
+
+        # Каталог вложений; относительный путь считается от рабочего каталога
+        self.upload_dir = _env("UPLOAD_DIR", "uploads")
+        # Сжатие вложений на диске: off | gzip | zstd (app/compression.py)
+        self.file_compression = _env("FILE_COMPRESSION", "off").lower()
+
+        # Фоновая обработка вложений (app/jobs.py)
+        self.file_workers = int(_env("FILE_WORKERS", str(os.cpu_count() or 1)))
+        self.file_job_attempts = int(_env("FILE_JOB_ATTEMPTS", "3"))
+        self.file_job_poll = float(_env("FILE_JOB_POLL", "5"))
+        self.file_job_timeout = float(_env("FILE_JOB_TIMEOUT", "600"))  # с
+
+        # Каталог тегов GET /tags: период перечитывания из БД, с; 0 — только
+        # при старте (достаточно для одного воркера)
+        self.tag_index_refresh = float(_env("TAG_INDEX_REFRESH", "0"))
+
+        # Уведомления о сроках (app/deadlines.py): за сколько секунд до срока
+        # слать task.due_soon (0 — только task.overdue) и куда их POST'ить
+        self.deadline_lead = float(_env("DEADLINE_LEAD", "0"))
+        self.deadline_webhook_url = _env_optional("DEADLINE_WEBHOOK_URL")
+        self.deadline_webhook_timeout = float(_env("DEADLINE_WEBHOOK_TIMEOUT", "5"))
+
+        # Поток событий GET /tasks/events
+        self.event_queue_size = int(_env("EVENT_QUEUE_SIZE", "256"))
+        self.event_heartbeat = float(_env("EVENT_HEARTBEAT", "15"))
+
+
+settings = Settings()
@@ -1,57 +1,206 @@
-from sqlalchemy import select, or_
+from sqlalchemy import select, and_, case, or_, func, tuple_, update, delete
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
+from sqlalchemy.orm import joinedload, selectinload
+from sqlalchemy.orm.exc import StaleDataError
 from datetime import datetime
-from . import models, schemas
-import os
-from typing import List, Optional
+from . import models, schemas, search as fts, jobs, stats, storage, metrics, fastjson
+from .cache import task_cache
+from .tags import tag_index
+from .deadlines import deadline_scheduler
+from .events import broker
+from .database import upsert, write_clock
+from collections import Counter
+from starlette.concurrency import run_in_threadpool
+import base64
+import json
+from typing import List, Optional, Tuple, Union
+
+
+async def _notify(event_type: str, task_id: int, **data):
+    # После commit: сбрасываем кэш чтения и оповещаем подписчиков /tasks/events
+    await task_cache.invalidate(task_id)
+    broker.publish(event_type, task_id=task_id, **data)
+
+
+async def resolve_tags(db: AsyncSession, tag_names: List[str]) -> List[models.Tag]:
+    # Все теги задачи за один IN-запрос; недостающие вставляются одним
+    # INSERT ... ON CONFLICT DO NOTHING в транзакции вызывающего кода
+    names = list(dict.fromkeys(tag_names))
+    if not names:
+        return []
+
+    result = await db.execute(
+        select(models.Tag).where(models.Tag.name.in_(names)))
+    tags = {tag.name: tag for tag in result.scalars()}
+
+    missing = [name for name in names if name not in tags]
+    if missing:
+        await db.execute(
+            upsert(models.Tag)
+            .values([{"name": name} for name in missing])
+            .on_conflict_do_nothing(index_elements=["name"])
+        )
+        # Перечитываем: часть тегов могла вставить параллельная транзакция
+        result = await db.execute(
+            select(models.Tag).where(models.Tag.name.in_(missing)))
+        tags.update((tag.name, tag) for tag in result.scalars())
+
+    return [tags[name] for name in names]
 
 
 async def get_or_create_tag(db: AsyncSession, tag_name: str) -> models.Tag:
-    query = select(models.Tag).where(models.Tag.name == tag_name)
-    result = await db.execute(query)
-    tag = result.scalar_one_or_none()
+    tags = await resolve_tags(db, [tag_name])
+    return tags[0]
 
-    if tag is None:
-        tag = models.Tag(name=tag_name)
-        db.add(tag)
-        await db.commit()
-        await db.refresh(tag)
 
-    return tag
+def date_error(
+    start_date: Optional[datetime],
+    end_date: Optional[datetime],
+    deadline: Optional[datetime]
+) -> Optional[str]:
+    if start_date and end_date and start_date > end_date:
+        return "Start date cannot be later than end date"
+    if deadline and start_date and deadline < start_date:
+        return "Deadline cannot be earlier than start date"
+    return None
 
 
-async def create_task(db: AsyncSession, task: schemas.TaskCreate):
-    # Создаем задачу
-    db_task = models.Task(
+def _stat_keys(task: schemas.TaskCreate):
+    return stats.task_keys(
+        task.status, task.priority, task.deadline, dict.fromkeys(task.tags or []))
+
+
+def _new_task(task: schemas.TaskCreate, now: datetime) -> models.Task:
+    return models.Task(
         title=task.title,
         description=task.description,
         priority=task.priority,
         status=task.status,
-        deadline=task.deadline
+        start_date=task.start_date,
+        end_date=task.end_date,
+        deadline=task.deadline,
+        created_at=now,
+        updated_at=now
+    )
+
+
+async def _touch(db: AsyncSession, task_id: int):
+    # Изменение файлов задачи — тоже изменение задачи для ленты /tasks/changes
+    await db.execute(
+        update(models.Task)
+        .where(models.Task.id == task_id)
+        .values(updated_at=await write_clock(db), version=models.Task.version + 1)
     )
 
+
+async def create_task(
+    db: AsyncSession,
+    task: schemas.TaskCreate,
+    uploads: Optional[List[Tuple[str, storage.StoredUpload]]] = None
+):
+    # Создаем задачу
+    db_task = _new_task(task, await write_clock(db))
+
     # Добавляем теги
     if task.tags:
-        for tag_name in task.tags:
-            tag = await get_or_create_tag(db, tag_name)
-            db_task.tags.append(tag)
+        db_task.tags = await resolve_tags(db, task.tags)
 
     db.add(db_task)
-    await db.commit()
-    await db.refresh(db_task)
+    await db.flush()
+    await fts.index_tasks(db, [db_task])
+    delta = _stat_keys(task)
+    await stats.apply(db, delta)
+
+    # Файлы уже лежат в хранилище: добавляем их в той же транзакции
+    if uploads:
+        await _retain_blobs(db, [upload for _, upload in uploads])
+        files = _new_files(db_task.id, uploads)
+        db.add_all(files)
+        db.add_all(jobs.new_jobs(files))
 
-    # Загружаем связанные данные
+    # Загружаем связанные данные одним запросом ещё в транзакции записи:
+    # после commit он открыл бы новую и снова занял соединение писателя
     query = select(models.Task).options(
         selectinload(models.Task.files),
         selectinload(models.Task.tags)
-    ).where(models.Task.id == db_task.id)
-    result = await db.execute(query)
-    return result.scalar_one()
+    ).where(models.Task.id == db_task.id).execution_options(populate_existing=True)
+    db_task = (await db.execute(query)).scalar_one()
+    await db.commit()
+    tag_index.apply(delta)
+    deadline_scheduler.track(db_task.id, db_task.deadline, db_task.status)
+    await _notify("task.created", db_task.id)
+    if uploads:
+        jobs.job_queue.wake()
+    return db_task
 
 
-async def get_tasks(
-    db: AsyncSession,
+async def create_tasks_bulk(db: AsyncSession, tasks: List[schemas.TaskCreate]) -> int:
+    # Пачка задач одной транзакцией: теги всей пачки разрешаются разом,
+    # задачи вставляются через executemany, без перечитывания после commit
+    tags = await resolve_tags(
+        db, [name for task in tasks for name in task.tags or []])
+    tags_by_name = {tag.name: tag for tag in tags}
+
+    now = await write_clock(db)
+    db_tasks = []
+    for task in tasks:
+        db_task = _new_task(task, now)
+        db_task.tags = [tags_by_name[name]
+                        for name in dict.fromkeys(task.tags or [])]
+        db_tasks.append(db_task)
+
+    db.add_all(db_tasks)
+    await db.flush()
+    await fts.index_tasks(db, db_tasks)
+    delta = sum((_stat_keys(task) for task in tasks), Counter())
+    await stats.apply(db, delta)
+    await db.commit()
+    tag_index.apply(delta)
+    for db_task in db_tasks:
+        deadline_scheduler.track(db_task.id, db_task.deadline, db_task.status)
+    broker.publish("tasks.created", task_ids=[task.id for task in db_tasks])
+
+    # Пачки не должны копиться в identity map сессии
+    db.expunge_all()
+    return len(db_tasks)
+
+
+def encode_cursor(*values) -> str:
+    # Курсоры страниц и токены ленты изменений непрозрачны для клиента:
+    # позиция — JSON-список в base64, datetime в ISO. Страница: (created_at,
+    # id), в поиске по FTS (rank, id); лента: (updated_at, id, id надгробия)
+    raw = json.dumps([value.isoformat() if isinstance(value, datetime) else value
+                      for value in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, *parsers) -> tuple:
+    # По разборщику на элемент; любой неверный курсор — ValueError
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded))
+        if not isinstance(values, list) or len(values) != len(parsers):
+            raise ValueError(values)
+        return tuple(parse(value) for parse, value in zip(parsers, values))
+    except (ValueError, TypeError) as exc:
+        raise ValueError("Invalid cursor") from exc
+
+
+def _cursor_time(value) -> Optional[datetime]:
+    return None if value is None else datetime.fromisoformat(value)
+
+
+def _page_key(value) -> Union[datetime, float]:
+    # created_at строкой или rank числом
+    if isinstance(value, str):
+        return datetime.fromisoformat(value)
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError(value)
+    return value
+
+
+def _filter_tasks(
+    query,
     priority: Optional[schemas.Priority] = None,
     status: Optional[schemas.Status] = None,
     start_date_before: Optional[datetime] = None,
@@ -61,54 +210,426 @@ async def get_tasks(
     deadline_before: Optional[datetime] = None,
     deadline_after: Optional[datetime] = None,
     search: Optional[str] = None,
-    tag: Optional[str] = None
+    tag: Optional[str] = None,
+    search_files: bool = False,
+    ranked=None
 ):
-    query = select(models.Task).options(
-        selectinload(models.Task.files),
-        selectinload(models.Task.tags)
-    )
-
-    # Применяем фильтры
+    # Применяем фильтры. ranked — CTE fts.ranked, уже присоединённый
+    # вызывающим (_list_query, _page_query)
     if priority:
         query = query.where(models.Task.priority == priority)
     if status:
         query = query.where(models.Task.status == status)
+    ranges = []
     if start_date_before:
-        query = query.where(models.Task.start_date <= start_date_before)
+        ranges.append(models.Task.start_date <= start_date_before)
     if start_date_after:
-        query = query.where(models.Task.start_date >= start_date_after)
+        ranges.append(models.Task.start_date >= start_date_after)
     if end_date_before:
-        query = query.where(models.Task.end_date <= end_date_before)
+        ranges.append(models.Task.end_date <= end_date_before)
     if end_date_after:
-        query = query.where(models.Task.end_date >= end_date_after)
+        ranges.append(models.Task.end_date >= end_date_after)
     if deadline_before:
-        query = query.where(models.Task.deadline <= deadline_before)
+        ranges.append(models.Task.deadline <= deadline_before)
     if deadline_after:
-        query = query.where(models.Task.deadline >= deadline_after)
+        ranges.append(models.Task.deadline >= deadline_after)
+    if ranges:
+        # Диапазоны дат — через IN, как и тег: id берутся из частичного
+        # индекса (ix_tasks_end_date и т.п.). Прямое условие планировщик
+        # SQLite проверяет, обходя весь ix_tasks_created_at_id ради порядка
+        dated = select(models.Task.id).where(*ranges).correlate(None)
+        query = query.where(models.Task.id.in_(dated))
     if search:
-        search_filter = or_(
-            models.Task.title.ilike(f"%{search}%"),
-            models.Task.description.ilike(f"%{search}%")
-        )
-        query = query.where(search_filter)
+        match = fts.match_query(search)
+        if match and ranked is not None:
+            # Совпадения отбирает JOIN с ranked; при search_files это LEFT
+            # JOIN, и id берутся из того же CTE. MATCH выполняется один раз
+            search_filter = models.Task.id.in_(select(ranked.c.rowid)) if search_files else None
+        elif match:
+            search_filter = models.Task.id.in_(fts.matches(match))
+        else:
+            search_filter = or_(
+                models.Task.title.ilike(f"%{search}%"),
+                models.Task.description.ilike(f"%{search}%")
+            )
+        if search_files:
+            # Плюс совпадения в тексте вложений (file_chunks)
+            search_filter = or_(search_filter, models.Task.id.in_(fts.file_matches(search)))
+        if search_filter is not None:
+            query = query.where(search_filter)
     if tag:
-        query = query.join(models.Task.tags).where(models.Tag.name == tag)
+        # IN по обратному индексу task_tags(tag_id, task_id): читаются только
+        # задачи с тегом; в отличие от JOIN строки не размножаются
+        tagged = (
+            select(models.task_tags.c.task_id)
+            .join(models.Tag, models.Tag.id == models.task_tags.c.tag_id)
+            .where(models.Tag.name == tag)
+        )
+        query = query.where(models.Task.id.in_(tagged))
+    return query
+
+
+# Колонки задачи для списков без ORM-объектов (см. get_task_rows)
+TASK_COLUMNS = [
+    models.Task.title,
+    models.Task.description,
+    models.Task.priority,
+    models.Task.status,
+    models.Task.start_date,
+    models.Task.end_date,
+    models.Task.deadline,
+    models.Task.id,
+    models.Task.created_at,
+    models.Task.updated_at,
+    models.Task.version,
+]
+
+
+def _list_query(query, **filters):
+    # При поиске сначала самые релевантные совпадения
+    match = fts.match_query(filters["search"]) if filters.get("search") else None
+    ranked = None
+    if match:
+        ranked = fts.ranked(match)
+        if filters.get("search_files"):
+            # Задачи, найденные только по вложениям, — после остальных
+            query = query.outerjoin(ranked, ranked.c.rowid == models.Task.id).order_by(
+                ranked.c.rank.is_(None), ranked.c.rank)
+        else:
+            query = query.join(ranked, ranked.c.rowid == models.Task.id).order_by(
+                ranked.c.rank)
+    query = _filter_tasks(query, ranked=ranked, **filters)
+
+    return query.order_by(models.Task.created_at.desc(), models.Task.id.desc())
+
+
+def _page_query(query, limit: int, cursor: Optional[str] = None, **filters):
+    position = decode_cursor(cursor, _page_key, int) if cursor else None
+
+    match = fts.match_query(filters["search"]) if filters.get("search") else None
+    if match:
+        # Поиск: самые релевантные первыми, keyset по (rank, id); rank
+        # отдаётся колонкой search_rank для курсора. Ранг совпадений FTS5
+        # отрицательный, поэтому найденные только по вложениям (0) — в конце
+        ranked = fts.ranked(match)
+        if filters.get("search_files"):
+            query = query.outerjoin(ranked, ranked.c.rowid == models.Task.id)
+            rank = func.coalesce(ranked.c.rank, 0.0)
+        else:
+            query = query.join(ranked, ranked.c.rowid == models.Task.id)
+            rank = ranked.c.rank
+        query = _filter_tasks(query, ranked=ranked, **filters)
+        query = query.add_columns(rank.label("search_rank"))
+        if position:
+            key, task_id = position
+            if isinstance(key, datetime):
+                raise ValueError("Invalid cursor")
+            query = query.where(
+                or_(rank > key, and_(rank == key, models.Task.id < task_id)))
+        return query.order_by(rank, models.Task.id.desc()).limit(limit + 1)
+
+    # Keyset-пагинация по (created_at, id): страница читается по индексу
+    # ix_tasks_created_at_id, без OFFSET и без сканирования всей таблицы
+    query = _filter_tasks(query, **filters)
+    if position:
+        created_at, task_id = position
+        if not isinstance(created_at, datetime):
+            raise ValueError("Invalid cursor")
+        query = query.where(
+            tuple_(models.Task.created_at, models.Task.id) < tuple_(created_at, task_id))
+
+    return query.order_by(
+        models.Task.created_at.desc(), models.Task.id.desc()).limit(limit + 1)
+
+
+def _split_page(rows, limit: int):
+    # Лишняя строка говорит о том, что есть следующая страница. Строки —
+    # колонки задачи или (Task,), при поиске с search_rank в конце
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        task = last[0] if isinstance(last[0], models.Task) else last
+        rank = getattr(last, "search_rank", None)
+        next_cursor = encode_cursor(task.created_at if rank is None else rank, task.id)
+    return rows, next_cursor
+
+
+async def get_tasks(db: AsyncSession, **filters):
+    query = _list_query(select(models.Task), **filters).options(
+        selectinload(models.Task.files),
+        selectinload(models.Task.tags)
+    )
+    result = await db.execute(query)
+    return result.scalars().all()
+
 
-    result = await db.execute(query.order_by(models.Task.created_at.desc()))
-    return result.scalars().unique().all()
+async def get_tasks_page(
+    db: AsyncSession,
+    limit: int,
+    cursor: Optional[str] = None,
+    **filters
+) -> Tuple[List[models.Task], Optional[str]]:
+    query = _page_query(select(models.Task), limit, cursor, **filters).options(
+        selectinload(models.Task.files),
+        selectinload(models.Task.tags)
+    )
+    result = await db.execute(query)
+    rows, next_cursor = _split_page(result.all(), limit)
+    return [row[0] for row in rows], next_cursor
+
+
+_FILE_FIELDS = ("id", "file_path", "processing_status", "preview")
+
+
+def _files_query(ids: List[int]):
+    return (
+        select(models.TaskFile.task_id, models.TaskFile.id, models.TaskFile.file_path,
+               models.TaskFile.processing_status, models.TaskFile.preview)
+        .where(models.TaskFile.task_id.in_(ids))
+        .order_by(models.TaskFile.id)
+    )
+
+
+def _tags_query(ids: List[int]):
+    return (
+        select(models.task_tags.c.task_id, models.Tag.name, models.Tag.id)
+        .join(models.Tag, models.Tag.id == models.task_tags.c.tag_id)
+        .where(models.task_tags.c.task_id.in_(ids))
+        .order_by(models.Tag.id)
+    )
+
+
+async def _task_rows(db: AsyncSession, rows) -> List[dict]:
+    # Строки Core вместо ORM: без identity map и валидации pydantic.
+    # Файлы и теги всей выборки — по одному запросу; порядок ключей и
+    # элементов совпадает со schemas.Task, поэтому JSON тот же байт в байт
+    ids = [row.id for row in rows]
+    files = {task_id: [] for task_id in ids}
+    tags = {task_id: [] for task_id in ids}
+    if ids:
+        for task_id, *file in await db.execute(_files_query(ids)):
+            files[task_id].append(dict(zip(_FILE_FIELDS, file)))
+        for task_id, name, tag_id in await db.execute(_tags_query(ids)):
+            tags[task_id].append({"name": name, "id": tag_id})
+
+    return [
+        {**row._asdict(), "files": files[row.id], "tags": tags[row.id]}
+        for row in rows
+    ]
+
+
+async def get_task_rows(db: AsyncSession, **filters) -> List[dict]:
+    result = await db.execute(_list_query(select(*TASK_COLUMNS), **filters))
+    return await _task_rows(db, result.all())
+
+
+async def get_task_rows_page(
+    db: AsyncSession,
+    limit: int,
+    cursor: Optional[str] = None,
+    **filters
+) -> Tuple[List[dict], Optional[str]]:
+    result = await db.execute(
+        _page_query(select(*TASK_COLUMNS), limit, cursor, **filters))
+    rows, next_cursor = _split_page(result.all(), limit)
+    tasks = await _task_rows(db, rows)
+    for task in tasks:
+        task.pop("search_rank", None)
+    return tasks, next_cursor
 
 
-async def add_files_to_task(db: AsyncSession, task_id: int, file_paths: list[str]):
-    files = [models.TaskFile(task_id=task_id, file_path=path)
-             for path in file_paths]
+async def get_changes(db: AsyncSession, since: Optional[str], limit: int) -> dict:
+    # Токен хранит позицию в двух потоках: (updated_at, id) задач и id
+    # надгробий удалённых задач. Без токена — синхронизация с нуля.
+    # updated_at растёт в порядке commit, пока писатели идут по очереди
+    # (SQLite, см. database.write_clock). На PostgreSQL транзакции пишут
+    # параллельно: начатая раньше может зафиксироваться позже с меньшим
+    # updated_at, и клиент, уже ушедший дальше, её не получит — там лента
+    # не гарантирует полноты, клиентам нужна периодическая полная синхронизация
+    updated_at, task_id, tombstone_id = (
+        decode_cursor(since, _cursor_time, int, int) if since else (None, 0, 0))
+
+    query = select(models.Task).options(
+        selectinload(models.Task.files),
+        selectinload(models.Task.tags)
+    )
+    if updated_at is not None:
+        query = query.where(
+            tuple_(models.Task.updated_at, models.Task.id) > tuple_(updated_at, task_id))
+    result = await db.execute(query.order_by(
+        models.Task.updated_at, models.Task.id).limit(limit + 1))
+    changed = result.scalars().all()
+
+    result = await db.execute(
+        select(models.TaskTombstone)
+        .where(models.TaskTombstone.id > tombstone_id)
+        .order_by(models.TaskTombstone.id)
+        .limit(limit + 1)
+    )
+    tombstones = result.scalars().all()
+
+    has_more = len(changed) > limit or len(tombstones) > limit
+    changed, tombstones = changed[:limit], tombstones[:limit]
+    if changed:
+        updated_at, task_id = changed[-1].updated_at, changed[-1].id
+    if tombstones:
+        tombstone_id = tombstones[-1].id
+
+    return {
+        "changed": changed,
+        "deleted": [tombstone.task_id for tombstone in tombstones],
+        "next_token": encode_cursor(updated_at, task_id, tombstone_id),
+        "has_more": has_more,
+    }
+
+
+def _export_query(**filters):
+    columns = [
+        models.Task.id,
+        models.Task.title,
+        models.Task.description,
+        models.Task.priority,
+        models.Task.status,
+        models.Task.start_date,
+        models.Task.end_date,
+        models.Task.deadline,
+        models.Task.created_at,
+    ]
+    return _filter_tasks(select(*columns), **filters).order_by(
+        models.Task.created_at, models.Task.id)
+
+
+async def stream_tasks(db: AsyncSession, batch_size: int, **filters):
+    # Серверный курсор: в памяти не больше одной пачки строк, без ORM-объектов
+    query = _export_query(**filters)
+    result = await db.stream(query.execution_options(yield_per=batch_size))
+
+    async for rows in result.partitions():
+        ids = [row.id for row in rows]
+        tags = {task_id: [] for task_id in ids}
+        for task_id, name, _ in await db.execute(_tags_query(ids)):
+            tags[task_id].append(name)
+        yield [(row, tags[row.id]) for row in rows]
+
+
+async def _retain_blobs(db: AsyncSession, uploads: List[storage.StoredUpload]):
+    # Один upsert на все загруженные файлы: новый блоб или refcount + n
+    counts = Counter(upload.sha256 for upload in uploads)
+    sizes = {upload.sha256: upload.size for upload in uploads}
+    stmt = upsert(models.FileBlob).values([
+        {"sha256": sha256, "size": sizes[sha256], "refcount": count}
+        for sha256, count in counts.items()
+    ])
+    await db.execute(stmt.on_conflict_do_update(
+        index_elements=["sha256"],
+        set_={"refcount": models.FileBlob.refcount + stmt.excluded.refcount}
+    ))
+    # Файл блоба мог удалить sweep_blobs между save_upload и этой транзакцией
+    await run_in_threadpool(storage.ensure_blobs, uploads)
+
+
+async def _release_blobs(db: AsyncSession, files: List[models.TaskFile]) -> Tuple[List[str], List[str]]:
+    # Уменьшаем refcount; строки с нулём остаются до sweep_blobs. Возвращаем
+    # затронутые sha256 и пути старых файлов для удаления после commit
+    counts = Counter(file.sha256 for file in files if file.sha256)
+    for sha256, count in counts.items():
+        await db.execute(
+            update(models.FileBlob)
+            .where(models.FileBlob.sha256 == sha256)
+            .values(refcount=models.FileBlob.refcount - count)
+        )
+
+    # Файлы, сохранённые до появления хранилища блобов, удаляем напрямую
+    legacy = [file.file_path for file in files if not file.sha256]
+    return list(counts), legacy
+
+
+async def sweep_blobs(db: AsyncSession, hashes: List[str]):
+    # Единственное место, где удаляются файлы блобов. DELETE строк с
+    # refcount 0 берёт блокировку записи, и файлы удаляются до commit: upsert
+    # в _retain_blobs того же sha256 ждёт этой транзакции, а потом
+    # восстанавливает файл из своей запасной ссылки
+    if not hashes:
+        return
+    result = await db.execute(
+        delete(models.FileBlob)
+        .where(models.FileBlob.sha256.in_(set(hashes)), models.FileBlob.refcount <= 0)
+        .returning(models.FileBlob.sha256)
+    )
+    await storage.remove_files(
+        [path for sha256 in result.scalars() for path in storage.blob_paths(sha256)])
+    await db.commit()
+
+
+async def discard_unreferenced_blobs(db: AsyncSession, uploads: List[storage.StoredUpload]):
+    # Для неудачной загрузки: блобы без строки получают строку с refcount 0
+    # и удаляются общей очисткой, если на них никто не ссылается
+    if not uploads:
+        return
+    await db.execute(
+        upsert(models.FileBlob)
+        .values([{"sha256": upload.sha256, "size": upload.size, "refcount": 0}
+                 for upload in uploads])
+        .on_conflict_do_nothing(index_elements=["sha256"])
+    )
+    await sweep_blobs(db, [upload.sha256 for upload in uploads])
+
+
+async def _discard_file_data(db: AsyncSession, file_ids: List[int]):
+    # Очередь обработки и извлечённый текст удаляемых файлов
+    if file_ids:
+        await db.execute(
+            delete(models.FileJob).where(models.FileJob.task_file_id.in_(file_ids)))
+        await fts.unindex_files(db, file_ids)
+
+
+def _new_files(
+    task_id: int,
+    uploads: List[Tuple[str, storage.StoredUpload]]
+) -> List[models.TaskFile]:
+    return [
+        models.TaskFile(
+            task_id=task_id,
+            file_path=storage.task_file_path(task_id, name),
+            sha256=upload.sha256,
+            encoding=upload.encoding
+        )
+        for name, upload in uploads
+    ]
+
+
+async def add_files_to_task(
+    db: AsyncSession,
+    task_id: int,
+    uploads: List[Tuple[str, storage.StoredUpload]]
+):
+    await _retain_blobs(db, [upload for _, upload in uploads])
+    files = _new_files(task_id, uploads)
     db.add_all(files)
+    # Разбор файлов — в фоне: ответ не ждёт обработки (см. app/jobs.py)
+    db.add_all(jobs.new_jobs(files))
+    await _touch(db, task_id)
     await db.commit()
+    await _notify("files.added", task_id, file_ids=[file.id for file in files])
+    jobs.job_queue.wake()
     # Можно вернуть обновлённые файлы, если нужно
     return files
 
 
-async def update_task(db: AsyncSession, task_id: int, task_data: schemas.TaskUpdate):
-    # Получаем задачу со всеми связанными данными
+class VersionConflict(Exception):
+    # Задачу изменили после того, как клиент её прочитал (If-Match)
+    pass
+
+
+async def update_task(
+    db: AsyncSession,
+    task_id: int,
+    task_data: schemas.TaskUpdate,
+    expected_version: Optional[int] = None
+):
+    # Одна транзакция: задача читается один раз, UPDATE проверяет версию
+    # (version_id_col), после commit объект не перечитывается
     query = select(models.Task).options(
         selectinload(models.Task.files),
         selectinload(models.Task.tags)
@@ -118,39 +639,195 @@ async def update_task(db: AsyncSession, task_id: int, task_data: schemas.TaskUpd
 
     if task is None:
         return None
+    if expected_version is not None and task.version != expected_version:
+        raise VersionConflict(task_id)
 
-    # Обновляем основные поля
     update_data = task_data.dict(exclude_unset=True)
+    error = date_error(
+        update_data.get("start_date", task.start_date),
+        update_data.get("end_date", task.end_date),
+        update_data.get("deadline", task.deadline)
+    )
+    if error:
+        raise ValueError(error)
+
+    old_keys = stats.keys_of(task)
+    old_deadline = task.deadline
+
+    # Обновляем основные поля
     if "tags" in update_data:
         tags = update_data.pop("tags")
-        task.tags = []
-        if tags:
-            for tag_name in tags:
-                tag = await get_or_create_tag(db, tag_name)
-                task.tags.append(tag)
+        task.tags = await resolve_tags(db, tags or [])
 
     for key, value in update_data.items():
         setattr(task, key, value)
+    if task.deadline != old_deadline:
+        # Уведомления о новом сроке отправляются заново (app/deadlines.py)
+        task.deadline_notified = None
+    task.updated_at = await write_clock(db)
+    try:
+        await db.flush()
+    except StaleDataError:
+        # Параллельный UPDATE успел между чтением и записью
+        await db.rollback()
+        raise VersionConflict(task_id)
+
+    if "title" in update_data or "description" in update_data:
+        await fts.index_task(db, task)
+    delta = stats.changes(old_keys, stats.keys_of(task))
+    await stats.apply(db, delta)
 
     await db.commit()
-    await db.refresh(task)
+    tag_index.apply(delta)
+    deadline_scheduler.track(task_id, task.deadline, task.status)
+    await _notify("task.updated", task_id)
+    return task
 
-    # Перезагружаем задачу со всеми связанными данными
-    query = select(models.Task).options(
-        selectinload(models.Task.files),
-        selectinload(models.Task.tags)
-    ).where(models.Task.id == task_id)
-    result = await db.execute(query)
-    return result.scalar_one()
+
+# Размер пачки id в IN (...): держит число параметров запроса в пределах
+# лимитов SQLite и asyncpg
+BATCH_CHUNK_SIZE = 1000
+
+
+def _chunks(values: list, size: int = BATCH_CHUNK_SIZE):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+async def _batch_targets(db: AsyncSession, ids: Optional[List[int]], **filters):
+    # Только поля для проверки дат и пересчёта счётчиков, без ORM-объектов
+    query = _filter_tasks(select(
+        models.Task.id, models.Task.status, models.Task.priority,
+        models.Task.start_date, models.Task.end_date, models.Task.deadline
+    ), **filters)
+    if ids is None:
+        return (await db.execute(query)).all()
+    rows = []
+    for chunk in _chunks(list(dict.fromkeys(ids))):
+        rows.extend(await db.execute(query.where(models.Task.id.in_(chunk))))
+    return rows
+
+
+async def update_tasks_batch(
+    db: AsyncSession,
+    changes: schemas.TaskBatchUpdate,
+    **filters
+) -> int:
+    # Массовое изменение одной транзакцией: UPDATE tasks и вставка/удаление
+    # связей task_tags идут по пачкам id, задачи в сессию не загружаются
+    patch = changes.patch.dict(exclude_unset=True)
+    add_names = list(dict.fromkeys(changes.add_tags))
+    remove_names = list(dict.fromkeys(changes.remove_tags))
+    if set(add_names) & set(remove_names):
+        raise ValueError("Tag cannot be both added and removed")
+
+    rows = await _batch_targets(db, changes.ids, **filters)
+    if not rows:
+        return 0
+    ids = [row.id for row in rows]
+
+    if {"start_date", "end_date", "deadline"} & patch.keys():
+        for row in rows:
+            error = date_error(
+                patch.get("start_date", row.start_date),
+                patch.get("end_date", row.end_date),
+                patch.get("deadline", row.deadline)
+            )
+            if error:
+                raise ValueError(f"Task {row.id}: {error}")
+
+    delta = Counter()
+    if {"status", "priority", "deadline"} & patch.keys():
+        for row in rows:
+            delta.update(stats.task_keys(
+                patch.get("status", row.status), patch.get("priority", row.priority),
+                patch.get("deadline", row.deadline), []))
+            delta.subtract(stats.task_keys(row.status, row.priority, row.deadline, []))
+
+    add_tags = await resolve_tags(db, add_names)
+    remove_tags = []
+    if remove_names:
+        result = await db.execute(
+            select(models.Tag).where(models.Tag.name.in_(remove_names)))
+        remove_tags = list(result.scalars())
+    tag_names = {tag.id: tag.name for tag in add_tags + remove_tags}
+
+    task_tags = models.task_tags
+    now = await write_clock(db)
+    if "deadline" in patch:
+        # Уведомления о сроке сбрасываются только там, где срок изменился
+        patch["deadline_notified"] = case(
+            (models.Task.deadline == patch["deadline"], models.Task.deadline_notified),
+            else_=None)
+    for chunk in _chunks(ids):
+        if tag_names:
+            # Уже существующие связи с затронутыми тегами
+            existing = {tuple(row) for row in await db.execute(
+                select(task_tags.c.task_id, task_tags.c.tag_id)
+                .where(task_tags.c.task_id.in_(chunk),
+                       task_tags.c.tag_id.in_(list(tag_names)))
+            )}
+            added = [{"task_id": task_id, "tag_id": tag.id}
+                     for task_id in chunk for tag in add_tags
+                     if (task_id, tag.id) not in existing]
+            if added:
+                await db.execute(task_tags.insert(), added)
+            if remove_tags:
+                await db.execute(
+                    delete(task_tags)
+                    .where(task_tags.c.task_id.in_(chunk),
+                           task_tags.c.tag_id.in_([tag.id for tag in remove_tags]))
+                )
+            for pair in added:
+                delta[stats.TAG, tag_names[pair["tag_id"]]] += 1
+            for task_id, tag_id in existing:
+                if tag_names[tag_id] in remove_names:
+                    delta[stats.TAG, tag_names[tag_id]] -= 1
+
+        # updated_at и version меняются и при изменении одних тегов:
+        # задачи попадают в /tasks/changes, If-Match видит изменение
+        await db.execute(
+            update(models.Task)
+            .where(models.Task.id.in_(chunk))
+            .values(**patch, updated_at=now, version=models.Task.version + 1)
+        )
+
+    await stats.apply(db, delta)
+    await db.commit()
+    tag_index.apply(delta)
+    if {"status", "deadline"} & patch.keys():
+        for row in rows:
+            deadline_scheduler.track(row.id, patch.get("deadline", row.deadline),
+                                     patch.get("status", row.status))
+    await task_cache.invalidate(*ids)
+    broker.publish("tasks.updated", task_ids=ids)
+    return len(ids)
 
 
 async def delete_task(db: AsyncSession, task_id: int):
-    result = await db.execute(select(models.Task).where(models.Task.id == task_id))
+    result = await db.execute(
+        select(models.Task)
+        .options(selectinload(models.Task.files), selectinload(models.Task.tags))
+        .where(models.Task.id == task_id)
+    )
     task = result.scalar_one_or_none()
     if task is None:
         return False
+    hashes, legacy_paths = await _release_blobs(db, task.files)
+    await _discard_file_data(db, [file.id for file in task.files])
+    await fts.unindex_task(db, task_id)
+    delta = stats.changes(stats.keys_of(task), Counter())
+    await stats.apply(db, delta)
+    db.add(models.TaskTombstone(task_id=task_id))
     await db.delete(task)
     await db.commit()
+    tag_index.apply(delta)
+    deadline_scheduler.cancel(task_id)
+    await _notify("task.deleted", task_id)
+
+    # Физически удаляем только файлы, на которые больше нет ссылок
+    await sweep_blobs(db, hashes)
+    await storage.remove_files(legacy_paths)
     return True
 
 
@@ -163,21 +840,61 @@ async def get_task(db: AsyncSession, task_id: int):
     return result.scalar_one_or_none()
 
 
-async def delete_task_file(db: AsyncSession, task_id: int, file_id: int):
-    query = select(models.TaskFile).where(
+async def get_task_file(db: AsyncSession, task_id: int, file_id: int):
+    # Блоб тем же запросом: его размер нужен для отдачи сжатых файлов
+    query = select(models.TaskFile).options(joinedload(models.TaskFile.blob)).where(
         models.TaskFile.id == file_id,
         models.TaskFile.task_id == task_id
     )
     result = await db.execute(query)
-    file = result.scalar_one_or_none()
+    return result.scalar_one_or_none()
+
+
+async def get_blob_sizes(db: AsyncSession, hashes: List[str]) -> dict:
+    # Исходные размеры блобов по sha256
+    if not hashes:
+        return {}
+    result = await db.execute(
+        select(models.FileBlob.sha256, models.FileBlob.size)
+        .where(models.FileBlob.sha256.in_(set(hashes))))
+    return dict(result.all())
+
+
+async def get_task_payload(db: AsyncSession, task_id: int) -> Optional[dict]:
+    # Сериализованная задача для кэша чтения (см. app/cache.py)
+    task = await get_task(db, task_id)
+    if task is None:
+        return None
+    with metrics.timed_serialization():
+        return schemas.Task.model_validate(task, from_attributes=True).model_dump(mode="json")
+
+
+async def get_recent_task_payloads(db: AsyncSession, limit: int) -> List[dict]:
+    # Последние изменённые задачи в форме get_task_payload (JSON-типы) —
+    # для прогрева кэша при старте; порядок по индексу (updated_at, id)
+    result = await db.execute(
+        select(*TASK_COLUMNS)
+        .order_by(models.Task.updated_at.desc(), models.Task.id.desc())
+        .limit(limit)
+    )
+    return json.loads(fastjson.dumps(await _task_rows(db, result.all())))
+
+
+async def delete_task_file(db: AsyncSession, task_id: int, file_id: int):
+    file = await get_task_file(db, task_id, file_id)
     if file is None:
         return False
 
-    # Удаляем физический файл
-    if os.path.exists(file.file_path):
-        os.remove(file.file_path)
+    hashes, legacy_paths = await _release_blobs(db, [file])
+    await _discard_file_data(db, [file.id])
 
     # Удаляем запись из БД
     await db.delete(file)
+    await _touch(db, task_id)
     await db.commit()
+    await _notify("file.deleted", task_id, file_id=file_id)
+
+    # Удаляем физический файл, если на него больше никто не ссылается
+    await sweep_blobs(db, hashes)
+    await storage.remove_files(legacy_paths)
     return True
@@ -1,15 +1,128 @@
+import asyncio
+from datetime import datetime, timedelta
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.orm import declarative_base
+from .config import settings
 
-DATABASE_URL = "sqlite+aiosqlite:///./database.db"
+DATABASE_URL = settings.database_url
+IS_SQLITE = make_url(DATABASE_URL).get_backend_name() == "sqlite"
 
-engine = create_async_engine(DATABASE_URL, echo=True)
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={settings.sqlite_busy_timeout}")
+    cursor.execute(f"PRAGMA cache_size={settings.sqlite_cache_size}")
+    cursor.execute(f"PRAGMA mmap_size={settings.sqlite_mmap_size}")
+    cursor.close()
+
+
+def _use_explicit_begin(dbapi_connection, connection_record):
+    # Транзакции открывает _begin_immediate, а не драйвер
+    dbapi_connection.isolation_level = None
+
+
+def _begin_immediate(conn):
+    # Пишущая транзакция сразу берёт блокировку записи: писатели из разных
+    # процессов выполняются по очереди целиком, и время, взятое внутри
+    # транзакции (write_clock), идёт в порядке commit
+    conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+
+def _set_sqlite_read_only(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA query_only=ON")
+    cursor.close()
+
+
+def _create_engines():
+    if IS_SQLITE:
+        # SQLite допускает одного писателя: все записи идут через единственный
+        # коннект (остальные ждут в пуле, а не ловят "database is locked"),
+        # чтения в WAL-режиме обслуживаются отдельным пулом параллельно
+        write_engine = create_async_engine(
+            DATABASE_URL, echo=settings.db_echo,
+            pool_size=1, max_overflow=0, pool_timeout=settings.db_pool_timeout)
+        read_engine = create_async_engine(
+            DATABASE_URL, echo=settings.db_echo,
+            pool_size=settings.sqlite_read_pool_size, max_overflow=0,
+            pool_timeout=settings.db_pool_timeout)
+        for sqlite_engine in (write_engine, read_engine):
+            event.listen(sqlite_engine.sync_engine, "connect", _set_sqlite_pragmas)
+        event.listen(write_engine.sync_engine, "connect", _use_explicit_begin)
+        event.listen(write_engine.sync_engine, "begin", _begin_immediate)
+        event.listen(read_engine.sync_engine, "connect", _set_sqlite_read_only)
+        return write_engine, read_engine
+
+    engine = create_async_engine(
+        DATABASE_URL,
+        echo=settings.db_echo,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout,
+        pool_recycle=settings.db_pool_recycle,
+        pool_pre_ping=True,
+    )
+    return engine, engine
+
+
+engine, read_engine = _create_engines()
 async_session = async_sessionmaker(
     bind=engine, class_=AsyncSession, expire_on_commit=False)
+read_session = async_sessionmaker(
+    bind=read_engine, class_=AsyncSession, expire_on_commit=False)
 
 Base = declarative_base()
 
 
+def upsert(table):
+    # INSERT с ON CONFLICT в диалекте текущей базы
+    if IS_SQLITE:
+        return sqlite.insert(table)
+    return postgresql.insert(table)
+
+
+_last_write_time = datetime.min
+
+
+async def write_clock(db: AsyncSession) -> datetime:
+    # Время изменения для updated_at берётся, когда транзакция уже держит
+    # пишущий коннект (на SQLite — и блокировку записи), и строго растёт в
+    # процессе: writer, ждавший в очереди, не запишет время раньше уже
+    # зафиксированных строк, и /tasks/changes их не пропустит
+    global _last_write_time
+    await db.connection()
+    _last_write_time = max(datetime.utcnow(), _last_write_time + timedelta(microseconds=1))
+    return _last_write_time
+
+
+async def warm_up(connections: int):
+    # Коннекты открываются заранее и остаются в пуле: первые запросы после
+    # старта не платят за соединение и PRAGMA
+    for target in dict.fromkeys([engine, read_engine]):
+        count = min(connections, target.pool.size())
+        opened = await asyncio.gather(*(target.connect() for _ in range(count)))
+        for conn in opened:
+            await conn.exec_driver_sql("SELECT 1")
+            await conn.close()
+
+
+async def dispose_engines():
+    await engine.dispose()
+    if read_engine is not engine:
+        await read_engine.dispose()
+
+
 async def get_db():
     async with async_session() as session:
         yield session
+
+
+async def get_read_db():
+    # Сессия только для чтения: на SQLite не занимает пишущий коннект
+    async with read_session() as session:
+        yield session
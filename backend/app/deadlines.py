@@ -0,0 +1,211 @@
+import asyncio
+import heapq
+import json
+import logging
+import urllib.request
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import literal_column, or_, select, tuple_, update
+from . import models, schemas
+from .config import settings
+from .database import async_session, read_session
+from .events import broker
+
+# Уведомления о сроках задач. Ближайшие срабатывания лежат в min-куче в
+# памяти процесса: куча загружается при старте одним запросом по частичному
+# индексу ix_tasks_open_deadline (вместе с просроченными за время простоя,
+# о которых ещё не сообщили), дальше crud сообщает об изменениях сроков
+# после commit (O(log n) на изменение). Устаревшие записи из кучи не
+# удаляются, а пропускаются при извлечении.
+#
+# События: task.due_soon (за DEADLINE_LEAD секунд до срока) и task.overdue
+# (срок наступил) — в /tasks/events, в лог и на DEADLINE_WEBHOOK_URL.
+# Кучу загружает каждый воркер, но срабатывание забирается в базе условным
+# UPDATE tasks.deadline_notified (как задания в jobs._claim): уведомление
+# отправляет один воркер, и подписчики /tasks/events получают его от него,
+# как и остальные события задач.
+
+logger = logging.getLogger(__name__)
+
+DUE_SOON = "task.due_soon"
+OVERDUE = "task.overdue"
+# Сколько срабатываний проверяется по базе за раз
+FIRE_BATCH_SIZE = 500
+
+# (время срабатывания, id задачи, событие, срок)
+Entry = Tuple[datetime, int, str, datetime]
+
+
+def open_deadlines_query():
+    # Условие повторяет предикат частичного индекса буквально, иначе SQLite
+    # его не использует. Срок не ограничен снизу: task.overdue, не
+    # отправленное до остановки, отправляется после старта
+    notified = models.Task.deadline_notified
+    return (
+        select(models.Task.id, models.Task.deadline, notified)
+        .where(models.Task.deadline.is_not(None),
+               models.Task.status != literal_column("'DONE'"),
+               or_(notified.is_(None), notified != OVERDUE))
+    )
+
+
+def _post(url: str, payload: bytes, timeout: float):
+    request = urllib.request.Request(
+        url, data=payload, headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        response.read()
+
+
+class DeadlineScheduler:
+    def __init__(self, lead: float, webhook_url: Optional[str] = None,
+                 webhook_timeout: float = 5):
+        self.lead = timedelta(seconds=lead)
+        self.webhook_url = webhook_url
+        self.webhook_timeout = webhook_timeout
+        self._heap: List[Entry] = []
+        # Актуальный срок каждой отслеживаемой задачи
+        self._deadlines: Dict[int, datetime] = {}
+        self._runner: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._deliveries = set()
+        self.fired = 0
+
+    def _entries(self, task_id: int, deadline: datetime, since: datetime) -> List[Entry]:
+        entries = [(deadline, task_id, OVERDUE, deadline)]
+        if self.lead and deadline - self.lead > since:
+            entries.append((deadline - self.lead, task_id, DUE_SOON, deadline))
+        return entries
+
+    async def start(self):
+        if self._runner is not None:
+            return
+        self._wake = asyncio.Event()
+        self._runner = asyncio.create_task(self._run())
+        now = datetime.utcnow()
+        async with read_session() as db:
+            result = await db.execute(open_deadlines_query())
+        # Изменения, пришедшие из crud во время загрузки, новее снимка.
+        # Прошедшие сроки попадают в вершину кучи и забираются через _claim
+        # сразу; пропущенное task.due_soon досылается, пока срок не наступил
+        for task_id, deadline, notified in result:
+            if task_id not in self._deadlines:
+                self._deadlines[task_id] = deadline
+                since = datetime.min if notified is None and deadline > now else now
+                self._heap.extend(self._entries(task_id, deadline, since))
+        heapq.heapify(self._heap)
+        self._wake.set()
+
+    async def stop(self):
+        if self._runner is None:
+            return
+        self._runner.cancel()
+        await asyncio.gather(self._runner, *self._deliveries, return_exceptions=True)
+        self._runner = None
+        self._heap, self._deadlines = [], {}
+
+    def track(self, task_id: int, deadline: Optional[datetime],
+              status: Optional[schemas.Status]):
+        # Вызывается из crud после commit: новый срок/статус задачи
+        if self._runner is None:
+            return
+        now = datetime.utcnow()
+        if deadline is None or status == schemas.Status.DONE or deadline <= now:
+            self._deadlines.pop(task_id, None)
+            return
+        if self._deadlines.get(task_id) == deadline:
+            return
+        self._deadlines[task_id] = deadline
+        # Срок уже ближе DEADLINE_LEAD: due_soon срабатывает сразу
+        for entry in self._entries(task_id, deadline, datetime.min):
+            heapq.heappush(self._heap, entry)
+        self._compact()
+        self._wake.set()
+
+    def cancel(self, task_id: int):
+        self._deadlines.pop(task_id, None)
+
+    def _compact(self):
+        # Устаревших записей не больше, чем актуальных
+        if len(self._heap) > 4 * len(self._deadlines) + 1024:
+            self._heap = [entry for entry in self._heap
+                          if self._deadlines.get(entry[1]) == entry[3]]
+            heapq.heapify(self._heap)
+
+    def __len__(self):
+        return len(self._deadlines)
+
+    async def _run(self):
+        while True:
+            self._wake.clear()
+            now = datetime.utcnow()
+            due = []
+            while self._heap and self._heap[0][0] <= now and len(due) < FIRE_BATCH_SIZE:
+                entry = heapq.heappop(self._heap)
+                _, task_id, event, deadline = entry
+                if self._deadlines.get(task_id) != deadline:
+                    continue
+                if event == OVERDUE:
+                    del self._deadlines[task_id]
+                due.append(entry)
+            if due:
+                try:
+                    await self._fire(due)
+                except Exception:
+                    logger.exception("deadline notifications failed")
+                continue
+            timeout = (self._heap[0][0] - now).total_seconds() if self._heap else None
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _claim(self, due: List[Entry]) -> List[dict]:
+        # UPDATE проходит, только если срок не менялся (в том числе в другом
+        # процессе), задача не закрыта и это уведомление ещё никто не отправил
+        notifications = []
+        notified = models.Task.deadline_notified
+        async with async_session() as db:
+            for event, earlier in ((DUE_SOON, notified.is_(None)),
+                                   (OVERDUE, or_(notified.is_(None), notified == DUE_SOON))):
+                keys = [(task_id, deadline) for _, task_id, kind, deadline in due
+                        if kind == event]
+                if not keys:
+                    continue
+                result = await db.execute(
+                    update(models.Task)
+                    .where(tuple_(models.Task.id, models.Task.deadline).in_(keys),
+                           models.Task.status != schemas.Status.DONE, earlier)
+                    .values(deadline_notified=event)
+                    .returning(models.Task.id, models.Task.deadline)
+                    .execution_options(synchronize_session=False)
+                )
+                notifications.extend(
+                    {"type": event, "task_id": task_id, "deadline": deadline.isoformat()}
+                    for task_id, deadline in result)
+            await db.commit()
+        return notifications
+
+    async def _fire(self, due: List[Entry]):
+        notifications = await self._claim(due)
+        for notification in notifications:
+            logger.info("%s: task %s, deadline %s", notification["type"],
+                        notification["task_id"], notification["deadline"])
+            broker.publish(notification["type"], task_id=notification["task_id"],
+                           deadline=notification["deadline"])
+        self.fired += len(notifications)
+        if notifications and self.webhook_url:
+            delivery = asyncio.create_task(self._deliver(notifications))
+            self._deliveries.add(delivery)
+            delivery.add_done_callback(self._deliveries.discard)
+
+    async def _deliver(self, notifications: List[dict]):
+        # Одна попытка на пачку; медленный webhook не задерживает срабатывания
+        payload = json.dumps({"events": notifications}, ensure_ascii=False).encode()
+        try:
+            await asyncio.to_thread(_post, self.webhook_url, payload, self.webhook_timeout)
+        except Exception as exc:
+            logger.warning("deadline webhook failed: %r", exc)
+
+
+deadline_scheduler = DeadlineScheduler(
+    settings.deadline_lead, settings.deadline_webhook_url, settings.deadline_webhook_timeout)
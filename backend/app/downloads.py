@@ -0,0 +1,208 @@
+import mimetypes
+import os
+import time
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Optional, Tuple
+from urllib.parse import quote
+from fastapi import Request
+from fastapi.responses import Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from . import compression, metrics
+from .storage import CHUNK_SIZE
+
+# Отдача вложений: ETag, условные запросы (304) и Range (206). Сжатый на
+# диске файл отдаётся как есть с Content-Encoding, если клиент принимает
+# этот кодек, иначе распаковывается на лету
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    # Поддерживаем один диапазон; для нескольких отдаём файл целиком (RFC 9110)
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, _, last = spec.strip().partition("-")
+    try:
+        if first:
+            start = int(first)
+            end = int(last) if last else size - 1
+        else:
+            # bytes=-N: последние N байт
+            suffix = int(last)
+            if suffix == 0:
+                raise RangeNotSatisfiable()
+            start, end = max(size - suffix, 0), size - 1
+    except ValueError:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable()
+    if start < 0 or end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+def _etag_list(header: str):
+    return [tag.strip() for tag in header.split(",")]
+
+
+def _weak(tag: str) -> str:
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def _not_modified(request: Request, etag: str, mtime: float) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # Для If-None-Match сравнение слабое
+        return if_none_match.strip() == "*" or _weak(etag) in map(_weak, _etag_list(if_none_match))
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(mtime) <= since
+    return False
+
+
+def _range_allowed(request: Request, etag: str, mtime: float) -> bool:
+    # If-Range: диапазон отдаём, только если представление не изменилось
+    if_range = request.headers.get("if-range")
+    if not if_range:
+        return True
+    if if_range.startswith('"') or if_range.startswith("W/"):
+        return not etag.startswith("W/") and if_range.strip() == etag
+    try:
+        return int(mtime) <= parsedate_to_datetime(if_range).timestamp()
+    except (TypeError, ValueError):
+        return False
+
+
+def accepts_encoding(request: Request, encoding: str) -> bool:
+    # Accept-Encoding: gzip, deflate;q=0.5, zstd;q=0
+    for item in request.headers.get("accept-encoding", "").split(","):
+        token, _, params = item.partition(";")
+        if token.strip().lower() not in (encoding, "*"):
+            continue
+        quality = params.strip().lower()
+        if quality.startswith("q="):
+            try:
+                return float(quality[2:]) > 0
+            except ValueError:
+                return False
+        return True
+    return False
+
+
+def content_disposition(filename: str) -> str:
+    quoted = quote(filename)
+    if quoted != filename:
+        return f"attachment; filename*=utf-8''{quoted}"
+    return f'attachment; filename="{filename}"'
+
+
+async def iter_file(path: str, start: int, length: int):
+    source = await run_in_threadpool(open, path, "rb")
+    started = time.perf_counter()
+    sent = 0
+    try:
+        await run_in_threadpool(source.seek, start)
+        while length > 0:
+            chunk = await run_in_threadpool(source.read, min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            sent += len(chunk)
+            yield chunk
+    finally:
+        await run_in_threadpool(source.close)
+        metrics.record_transfer("download", sent, time.perf_counter() - started)
+
+
+async def iter_decoded(path: str, encoding: str, start: int, length: int):
+    # Распаковка потоком; до начала диапазона данные читаются и отбрасываются
+    source = await run_in_threadpool(compression.open_stored, path, encoding)
+    started = time.perf_counter()
+    sent = 0
+    try:
+        while start > 0:
+            skipped = await run_in_threadpool(source.read, min(CHUNK_SIZE, start))
+            if not skipped:
+                break
+            start -= len(skipped)
+        while length > 0:
+            chunk = await run_in_threadpool(source.read, min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            sent += len(chunk)
+            yield chunk
+    finally:
+        await run_in_threadpool(source.close)
+        metrics.record_transfer("download", sent, time.perf_counter() - started)
+
+
+async def file_response(
+    request: Request,
+    path: str,
+    filename: str,
+    sha256: Optional[str] = None,
+    encoding: Optional[str] = None,
+    size: Optional[int] = None
+) -> Response:
+    # encoding/size: кодек файла на диске и исходный размер (FileBlob.size)
+    stat = await run_in_threadpool(os.stat, path)
+    passthrough = encoding is not None and accepts_encoding(request, encoding)
+    if encoding is None or passthrough:
+        size = stat.st_size
+
+    # Сильный ETag из хеша содержимого; для старых файлов без хеша — слабый.
+    # Сжатое представление — другие байты, поэтому и ETag другой
+    if sha256:
+        etag = f'"{sha256}-{encoding}"' if passthrough else f'"{sha256}"'
+    else:
+        etag = f'W/"{int(stat.st_mtime):x}-{size:x}"'
+
+    headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(stat.st_mtime, usegmt=True),
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "private, no-cache",
+    }
+    if encoding is not None:
+        headers["Vary"] = "Accept-Encoding"
+    if passthrough:
+        headers["Content-Encoding"] = encoding
+    if _not_modified(request, etag, stat.st_mtime):
+        return Response(status_code=304, headers=headers)
+
+    media_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    headers["Content-Disposition"] = content_disposition(filename)
+
+    byte_range = None
+    range_header = request.headers.get("range")
+    if range_header and _range_allowed(request, etag, stat.st_mtime):
+        try:
+            byte_range = parse_range(range_header, size)
+        except RangeNotSatisfiable:
+            return Response(status_code=416, headers={
+                **headers, "Content-Range": f"bytes */{size}"})
+
+    def body(start: int, length: int):
+        if encoding is None or passthrough:
+            return iter_file(path, start, length)
+        return iter_decoded(path, encoding, start, length)
+
+    if byte_range is None:
+        headers["Content-Length"] = str(size)
+        return StreamingResponse(body(0, size), media_type=media_type, headers=headers)
+
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(
+        body(start, end - start + 1),
+        status_code=206, media_type=media_type, headers=headers)
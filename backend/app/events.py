@@ -0,0 +1,80 @@
+import asyncio
+import itertools
+import json
+from typing import AsyncIterator, Set
+from .config import settings
+
+# Рассылка изменений задач подписчикам GET /tasks/events (в пределах процесса).
+# У каждого подписчика своя ограниченная очередь: медленный клиент не
+# накапливает события бесконечно, а отключается и досинхронизируется
+# через GET /tasks/changes.
+
+
+class Subscriber:
+    def __init__(self, maxsize: int):
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.overflowed = False
+
+
+class EventBroker:
+    def __init__(self, queue_size: int):
+        self.queue_size = queue_size
+        self._subscribers: Set[Subscriber] = set()
+        self._ids = itertools.count(1)
+        self.published = 0
+        self.dropped = 0
+
+    def subscribe(self) -> Subscriber:
+        subscriber = Subscriber(self.queue_size)
+        self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self._subscribers.discard(subscriber)
+
+    def publish(self, event_type: str, **data):
+        if not self._subscribers:
+            return
+        event = {"id": next(self._ids), "type": event_type, "data": data}
+        self.published += 1
+        for subscriber in list(self._subscribers):
+            try:
+                subscriber.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                subscriber.overflowed = True
+                self.unsubscribe(subscriber)
+                self.dropped += 1
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": len(self._subscribers),
+            "published": self.published,
+            "dropped_subscribers": self.dropped,
+        }
+
+
+def format_sse(event: dict) -> str:
+    payload = json.dumps(event["data"], ensure_ascii=False)
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {payload}\n\n"
+
+
+async def sse_stream(broker: "EventBroker", heartbeat: float) -> AsyncIterator[str]:
+    subscriber = broker.subscribe()
+    try:
+        yield "retry: 3000\n\n"
+        while True:
+            if subscriber.overflowed and subscriber.queue.empty():
+                # Клиент не успевал читать: пусть догонит через /tasks/changes
+                yield "event: overflow\ndata: {}\n\n"
+                return
+            try:
+                event = await asyncio.wait_for(subscriber.queue.get(), heartbeat)
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+                continue
+            yield format_sse(event)
+    finally:
+        broker.unsubscribe(subscriber)
+
+
+broker = EventBroker(settings.event_queue_size)
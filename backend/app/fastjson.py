@@ -0,0 +1,33 @@
+import json
+from datetime import date, datetime, timedelta
+from enum import Enum
+
+# Быстрая сборка JSON для списков задач: orjson, если установлен
+# (pip install my-tracker[fast]), иначе стандартный json. Формат совпадает
+# с сериализацией pydantic: компактный, UTF-8 без экранирования, даты ISO 8601
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - зависит от окружения
+    orjson = None
+
+
+def _default(value):
+    if isinstance(value, datetime):
+        text = value.isoformat()
+        if value.utcoffset() == timedelta(0):
+            text = text[:-6] + "Z"
+        return text
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(value) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(value, option=orjson.OPT_UTC_Z)
+    return json.dumps(
+        value, default=_default, ensure_ascii=False, separators=(",", ":")
+    ).encode()
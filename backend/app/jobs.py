@@ -0,0 +1,208 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+from typing import List, Optional
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import models, processors, search, storage
+from .cache import task_cache
+from .config import settings
+from .database import async_session, write_clock
+from .events import broker
+
+# Очередь фоновой обработки вложений. Задания лежат в таблице file_jobs и
+# добавляются в транзакции вместе с файлами (crud), поэтому переживают
+# перезапуск. Разбор файлов идёт в ProcessPoolExecutor и не блокирует
+# event loop; параллельность задаётся FILE_WORKERS.
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+SKIPPED = "skipped"
+FAILED = "failed"
+
+
+def new_jobs(files: List[models.TaskFile]) -> List[models.FileJob]:
+    for file in files:
+        file.processing_status = PENDING
+    return [models.FileJob(task_file=file, status=PENDING) for file in files]
+
+
+class JobQueue:
+    def __init__(self, concurrency: int):
+        self.concurrency = max(1, concurrency)
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._runner: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._running = set()
+
+    def _create_pool(self) -> ProcessPoolExecutor:
+        # spawn: дочерние процессы не наследуют потоки и коннекты родителя
+        return ProcessPoolExecutor(
+            max_workers=self.concurrency,
+            mp_context=multiprocessing.get_context("spawn"))
+
+    def start(self):
+        if self._runner is not None:
+            return
+        self._pool = self._create_pool()
+        self._wake = asyncio.Event()
+        self._slots = asyncio.Semaphore(self.concurrency)
+        self._runner = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._runner is None:
+            return
+        self._runner.cancel()
+        for job in list(self._running):
+            job.cancel()
+        await asyncio.gather(self._runner, *self._running, return_exceptions=True)
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        self._runner = self._pool = None
+
+    def wake(self):
+        # Вызывается после commit новых заданий; без запущенной очереди
+        # задания дождутся следующего старта
+        if self._wake is not None:
+            self._wake.set()
+
+    async def _run(self):
+        while True:
+            await self._slots.acquire()
+            self._wake.clear()
+            try:
+                job = await self._claim()
+            except Exception:
+                logger.exception("file job claim failed")
+                job = None
+            if job is None:
+                self._slots.release()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), settings.file_job_poll)
+                except asyncio.TimeoutError:
+                    await self._requeue_stale()
+                continue
+            task = asyncio.create_task(self._process(*job))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _requeue_stale(self):
+        # Задания, зависшие в running (упавший процесс), возвращаем в очередь
+        deadline = datetime.utcnow() - timedelta(seconds=settings.file_job_timeout)
+        async with async_session() as db:
+            await db.execute(
+                update(models.FileJob)
+                .where(models.FileJob.status == RUNNING,
+                       models.FileJob.updated_at < deadline)
+                .values(status=PENDING, updated_at=datetime.utcnow())
+            )
+            await db.commit()
+
+    async def _claim(self):
+        async with async_session() as db:
+            while True:
+                row = (await db.execute(
+                    select(models.FileJob.id, models.FileJob.attempts,
+                           models.TaskFile.id.label("file_id"),
+                           models.TaskFile.task_id, models.TaskFile.file_path,
+                           models.TaskFile.sha256, models.TaskFile.encoding)
+                    .join(models.TaskFile, models.TaskFile.id == models.FileJob.task_file_id)
+                    .where(models.FileJob.status == PENDING)
+                    .order_by(models.FileJob.id)
+                    .limit(1)
+                )).first()
+                if row is None:
+                    return None
+                # Условный UPDATE: задание забирает только один воркер
+                result = await db.execute(
+                    update(models.FileJob)
+                    .where(models.FileJob.id == row.id, models.FileJob.status == PENDING)
+                    .values(status=RUNNING, attempts=models.FileJob.attempts + 1,
+                            updated_at=datetime.utcnow())
+                )
+                await db.commit()
+                if result.rowcount == 1:
+                    return row.id, row.attempts + 1, row
+
+    async def _process(self, job_id: int, attempts: int, file):
+        try:
+            path = storage.file_location(file)
+            name = os.path.basename(file.file_path)
+            loop = asyncio.get_running_loop()
+            pool = self._pool
+            try:
+                result = await loop.run_in_executor(
+                    pool, processors.process_file, path, name, file.encoding)
+            except processors.Unsupported:
+                await self._finish(job_id, file, SKIPPED)
+            except Exception as exc:
+                # Упавший дочерний процесс ломает весь пул: пересоздаём его
+                if isinstance(exc, BrokenProcessPool) and self._pool is pool:
+                    self._pool = self._create_pool()
+                    pool.shutdown(wait=False)
+                if attempts < settings.file_job_attempts:
+                    await self._retry(job_id, repr(exc))
+                else:
+                    logger.warning("file job %s failed: %r", job_id, exc)
+                    await self._finish(job_id, file, FAILED, error=repr(exc))
+            else:
+                await self._finish(job_id, file, DONE, result=result)
+        except Exception:
+            logger.exception("file job %s: cannot save result", job_id)
+        finally:
+            self._slots.release()
+
+    async def _retry(self, job_id: int, error: str):
+        async with async_session() as db:
+            await db.execute(
+                update(models.FileJob)
+                .where(models.FileJob.id == job_id)
+                .values(status=PENDING, error=error, updated_at=datetime.utcnow())
+            )
+            await db.commit()
+        self.wake()
+
+    async def _finish(self, job_id: int, file, status: str,
+                      result: Optional[dict] = None, error: Optional[str] = None):
+        async with async_session() as db:
+            now = await write_clock(db)
+            await db.execute(
+                update(models.FileJob)
+                .where(models.FileJob.id == job_id)
+                .values(status=status, error=error, updated_at=now)
+            )
+            await save_result(db, file, status, result)
+            # Превью входит в представление задачи: обновляем updated_at
+            # для ленты /tasks/changes
+            await db.execute(
+                update(models.Task)
+                .where(models.Task.id == file.task_id)
+                .values(updated_at=now, version=models.Task.version + 1)
+            )
+            await db.commit()
+        await task_cache.invalidate(file.task_id)
+        broker.publish("file.processed", task_id=file.task_id,
+                       file_id=file.file_id, status=status)
+
+
+async def save_result(db: AsyncSession, file, status: str, result: Optional[dict]):
+    updated = await db.execute(
+        update(models.TaskFile)
+        .where(models.TaskFile.id == file.file_id)
+        .values(processing_status=status,
+                preview=result["preview"] if result else None)
+    )
+    # Файл могли удалить, пока он обрабатывался
+    if updated.rowcount:
+        await search.index_file_chunks(
+            db, file.file_id, file.task_id, result["chunks"] if result else [])
+
+
+job_queue = JobQueue(settings.file_workers)
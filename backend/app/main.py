@@ -1,13 +1,74 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from app.database import engine, Base
-from app.routers import tasks
+from fastapi.responses import PlainTextResponse
+from app.config import settings
+from app.database import engine, read_engine, read_session, Base, dispose_engines, warm_up
+from app import crud, metrics, schema
+from app.cache import task_cache
+from app.deadlines import deadline_scheduler
+from app.events import broker
+from app.jobs import job_queue
+from app.routers import tasks, tags
+from app.tags import tag_index
 
-app = FastAPI()
+logger = logging.getLogger(__name__)
 
 
-@app.on_event("startup")
-async def on_startup():
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+async def load_tag_index():
+    async with read_session() as db:
+        await tag_index.load(db)
+
+
+async def warm_task_cache(limit: int):
+    if limit > 0:
+        async with read_session() as db:
+            await task_cache.prime(lambda: crud.get_recent_task_payloads(db, limit))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Один раз на воркер: сверка схемы с head миграций (SCHEMA_MODE) вместо
+    # create_all, затем параллельный прогрев пулов и кэшей
+    started = time.perf_counter()
+    await schema.prepare(engine, settings.schema_mode)
+    await asyncio.gather(
+        warm_up(settings.db_pool_warmup),
+        load_tag_index(),
+        warm_task_cache(settings.task_cache_warmup),
+        deadline_scheduler.start(),
+    )
+    job_queue.start()
+    logger.info("startup finished in %.1f ms", (time.perf_counter() - started) * 1000)
+    try:
+        yield
+    finally:
+        await deadline_scheduler.stop()
+        await job_queue.stop()
+        await dispose_engines()
+
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(metrics.MetricsMiddleware)
+metrics.instrument([engine, read_engine], Base)
+metrics.registry.gauge(
+    "task_cache_hits", "Task cache hits", lambda: task_cache.stats()["hits"])
+metrics.registry.gauge(
+    "task_cache_misses", "Task cache misses", lambda: task_cache.stats()["misses"])
+metrics.registry.gauge(
+    "event_subscribers", "Connected SSE clients", lambda: broker.stats()["subscribers"])
+metrics.registry.gauge(
+    "tag_index_size", "Tags in the autocomplete index", lambda: len(tag_index))
+metrics.registry.gauge(
+    "deadlines_pending", "Open deadlines awaiting notification", lambda: len(deadline_scheduler))
+
+
+@app.get("/metrics", include_in_schema=False)
+async def read_metrics():
+    return PlainTextResponse(
+        metrics.registry.render(), media_type="text/plain; version=0.0.4")
 
 app.include_router(tasks.router, prefix="/tasks", tags=["tasks"])
+app.include_router(tags.router, prefix="/tags", tags=["tags"])
@@ -0,0 +1,242 @@
+import logging
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from sqlalchemy import event
+from .config import settings
+
+# Метрики запросов в формате Prometheus (GET /metrics) и журнал медленных
+# запросов. Счётчики по SQL, гидратации ORM и сериализации собираются в
+# контексте текущего запроса.
+
+logger = logging.getLogger("app.slow_requests")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 250, 500, 1000, 5000, 10000)
+THROUGHPUT_BUCKETS = tuple(2 ** power * 1024 * 1024 for power in range(-2, 11))
+MAX_CAPTURED_STATEMENTS = 100
+
+
+def _labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(
+        f'{name}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+        for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, *labels: str):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_labels(self.label_names, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labels: str):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+        index = bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            series[0][index] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        names = self.label_names + ("le",)
+        for labels, (counts, total, count) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_labels(names, labels + (repr(float(bound)),))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_labels(names, labels + ('+Inf',))} {count}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        # Внешние значения (кэш, подписчики событий) снимаются в момент выдачи
+        self._gauges: List[Tuple[str, str, Callable[[], float]]] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def gauge(self, name: str, documentation: str, read: Callable[[], float]):
+        self._gauges.append((name, documentation, read))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for name, documentation, read in self._gauges:
+            lines += [f"# HELP {name} {documentation}", f"# TYPE {name} gauge",
+                      f"{name} {read()}"]
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+REQUEST_LATENCY = registry.register(Histogram(
+    "http_request_duration_seconds", "Request latency by route",
+    ["method", "route", "status"]))
+REQUEST_SQL_QUERIES = registry.register(Histogram(
+    "http_request_sql_queries", "SQL statements executed per request",
+    ["method", "route"], COUNT_BUCKETS))
+REQUEST_SQL_SECONDS = registry.register(Histogram(
+    "http_request_sql_seconds", "Total SQL time per request",
+    ["method", "route"]))
+REQUEST_ROWS = registry.register(Histogram(
+    "http_request_rows_hydrated", "ORM objects loaded per request",
+    ["method", "route"], COUNT_BUCKETS))
+REQUEST_SERIALIZATION = registry.register(Histogram(
+    "http_request_serialization_seconds", "Response serialization time per request",
+    ["method", "route"]))
+SQL_QUERIES = registry.register(Counter(
+    "db_queries_total", "SQL statements executed"))
+FILE_BYTES = registry.register(Counter(
+    "file_transfer_bytes_total", "Attachment bytes transferred", ["direction"]))
+FILE_THROUGHPUT = registry.register(Histogram(
+    "file_transfer_bytes_per_second", "Attachment transfer throughput",
+    ["direction"], THROUGHPUT_BUCKETS))
+
+
+@dataclass
+class RequestStats:
+    sql_queries: int = 0
+    sql_seconds: float = 0.0
+    rows: int = 0
+    serialization_seconds: float = 0.0
+    statements: List[Tuple[float, str]] = field(default_factory=list)
+
+
+current_request: ContextVar[Optional[RequestStats]] = ContextVar(
+    "current_request", default=None)
+
+
+@contextmanager
+def timed_serialization():
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats = current_request.get()
+        if stats is not None:
+            stats.serialization_seconds += time.perf_counter() - started
+
+
+def record_transfer(direction: str, size: int, seconds: float):
+    FILE_BYTES.inc(size, direction)
+    if seconds > 0 and size:
+        FILE_THROUGHPUT.observe(size / seconds, direction)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+    SQL_QUERIES.inc()
+    stats = current_request.get()
+    if stats is None:
+        return
+    stats.sql_queries += 1
+    stats.sql_seconds += elapsed
+    if settings.slow_request_ms and len(stats.statements) < MAX_CAPTURED_STATEMENTS:
+        stats.statements.append((elapsed, statement))
+
+
+def _on_load(target, context):
+    stats = current_request.get()
+    if stats is not None:
+        stats.rows += 1
+
+
+def instrument(engines, base):
+    for engine in {id(engine): engine for engine in engines}.values():
+        event.listen(engine.sync_engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine.sync_engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(base, "load", _on_load, propagate=True)
+
+
+class MetricsMiddleware:
+    # Чистое ASGI-middleware: не буферизует потоковые ответы
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = current_request.set(stats)
+        status_code = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            current_request.reset(token)
+            route = scope.get("route")
+            path = getattr(route, "path", "unmatched")
+            method = scope["method"]
+            REQUEST_LATENCY.observe(elapsed, method, path, str(status_code))
+            REQUEST_SQL_QUERIES.observe(stats.sql_queries, method, path)
+            REQUEST_SQL_SECONDS.observe(stats.sql_seconds, method, path)
+            REQUEST_ROWS.observe(stats.rows, method, path)
+            REQUEST_SERIALIZATION.observe(stats.serialization_seconds, method, path)
+            if settings.slow_request_ms and elapsed * 1000 >= settings.slow_request_ms:
+                _log_slow_request(method, scope.get("path", path), status_code, elapsed, stats)
+
+
+def _log_slow_request(method: str, path: str, status_code: int, elapsed: float, stats: RequestStats):
+    statements = "\n".join(
+        f"  {seconds * 1000:8.2f} ms  {' '.join(statement.split())}"
+        for seconds, statement in stats.statements)
+    logger.warning(
+        "slow request %s %s -> %s in %.1f ms: %d SQL (%.1f ms), %d rows, "
+        "serialization %.1f ms\n%s",
+        method, path, status_code, elapsed * 1000, stats.sql_queries,
+        stats.sql_seconds * 1000, stats.rows, stats.serialization_seconds * 1000,
+        statements)
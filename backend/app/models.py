@@ -1,15 +1,17 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Enum as SQLEnum, Table
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Enum as SQLEnum, Table, Index, DDL, event, text
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from .database import Base
 from .schemas import Priority, Status
 
-# Таблица связи многие-ко-многим для тегов
+# Таблица связи многие-ко-многим для тегов. Первичный ключ (task_id, tag_id)
+# ищет теги задачи, обратный индекс — задачи по тегу (фильтр ?tag=)
 task_tags = Table(
     'task_tags',
     Base.metadata,
-    Column('task_id', Integer, ForeignKey('tasks.id')),
-    Column('tag_id', Integer, ForeignKey('tags.id'))
+    Column('task_id', Integer, ForeignKey('tasks.id'), primary_key=True),
+    Column('tag_id', Integer, ForeignKey('tags.id'), primary_key=True),
+    Index('ix_task_tags_tag_id_task_id', 'tag_id', 'task_id')
 )
 
 
@@ -33,17 +35,156 @@ class Task(Base):
     end_date = Column(DateTime, nullable=True)
     deadline = Column(DateTime, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+    # Версия для If-Match/ETag: ORM-обновления проверяют её в WHERE и
+    # увеличивают; Core-обновления задачи обязаны увеличивать её сами
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    # Последнее отправленное уведомление о сроке (app/deadlines.py),
+    # сбрасывается при смене срока. Служебное поле: в представление задачи
+    # не входит, updated_at и version не меняет
+    deadline_notified = Column(String(32), nullable=True)
 
+    # Явный порядок: ответы одинаковы при любом плане запроса
     files = relationship("TaskFile", back_populates="task",
-                         cascade="all, delete-orphan")
-    tags = relationship("Tag", secondary=task_tags, back_populates="tasks")
+                         cascade="all, delete-orphan", order_by="TaskFile.id")
+    tags = relationship("Tag", secondary=task_tags, back_populates="tasks",
+                        order_by="Tag.id")
+
+    __table_args__ = (
+        # Индекс под keyset-пагинацию списка задач
+        Index("ix_tasks_created_at_id", "created_at", "id"),
+        # Индекс под ленту изменений GET /tasks/changes
+        Index("ix_tasks_updated_at_id", "updated_at", "id"),
+        # Фильтры списка: равенство + тот же порядок, что у пагинации
+        Index("ix_tasks_status_created_at_id", "status", "created_at", "id"),
+        Index("ix_tasks_priority_created_at_id", "priority", "created_at", "id"),
+        # Диапазоны дат; пустые значения в индексы не попадают
+        Index("ix_tasks_start_date", "start_date",
+              sqlite_where=text("start_date IS NOT NULL"),
+              postgresql_where=text("start_date IS NOT NULL")),
+        Index("ix_tasks_end_date", "end_date",
+              sqlite_where=text("end_date IS NOT NULL"),
+              postgresql_where=text("end_date IS NOT NULL")),
+        Index("ix_tasks_deadline", "deadline",
+              sqlite_where=text("deadline IS NOT NULL"),
+              postgresql_where=text("deadline IS NOT NULL")),
+        # Сроки незавершённых задач: просрочка и task_stats
+        Index("ix_tasks_open_deadline", "deadline",
+              sqlite_where=text("deadline IS NOT NULL AND status != 'DONE'"),
+              postgresql_where=text("deadline IS NOT NULL AND status != 'DONE'")),
+        # id удалённой задачи не выдаётся заново: по нему в ленте
+        # /tasks/changes остаётся надгробие, а ETag содержит только версию
+        {"sqlite_autoincrement": True},
+    )
+    __mapper_args__ = {"version_id_col": version}
+
+
+class TaskTombstone(Base):
+    __tablename__ = "task_tombstones"
+
+    # Удалённые задачи для ленты изменений; id монотонно растёт
+    id = Column(Integer, primary_key=True)
+    task_id = Column(Integer, nullable=False)
+    deleted_at = Column(DateTime, default=datetime.utcnow)
+
+
+class TaskStat(Base):
+    __tablename__ = "task_stats"
+
+    # Счётчики для GET /tasks/stats (см. app/stats.py): dimension — status,
+    # priority, tag или deadline (день срока незавершённых задач)
+    dimension = Column(String, primary_key=True)
+    key = Column(String, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+
+# Полнотекстовый индекс по title/description (см. app/search.py)
+event.listen(
+    Task.__table__,
+    "after_create",
+    DDL(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS tasks_fts USING fts5("
+        "title, description, tokenize='unicode61 remove_diacritics 2')"
+    ).execute_if(dialect="sqlite")
+)
+event.listen(
+    Task.__table__,
+    "before_drop",
+    DDL("DROP TABLE IF EXISTS tasks_fts").execute_if(dialect="sqlite")
+)
+
+
+class FileBlob(Base):
+    __tablename__ = "file_blobs"
+
+    # Содержимое вложения, общее для всех TaskFile с одинаковым sha256.
+    # refcount 0 — блоб без ссылок, ждёт crud.sweep_blobs
+    sha256 = Column(String(64), primary_key=True)
+    size = Column(Integer)
+    refcount = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
 
 
 class TaskFile(Base):
     __tablename__ = "task_files"
 
     id = Column(Integer, primary_key=True, index=True)
-    task_id = Column(Integer, ForeignKey("tasks.id"))
+    task_id = Column(Integer, ForeignKey("tasks.id"), index=True)
     file_path = Column(String)
+    sha256 = Column(String(64), ForeignKey("file_blobs.sha256"),
+                    nullable=True, index=True)
+    # Кодек файла блоба на диске (gzip, zstd); NULL — без сжатия
+    encoding = Column(String(16), nullable=True)
+    # Результат фоновой обработки (app/jobs.py): pending, done, skipped, failed
+    processing_status = Column(String, nullable=True)
+    preview = Column(String, nullable=True)
 
     task = relationship("Task", back_populates="files")
+    blob = relationship("FileBlob")
+
+
+class FileJob(Base):
+    __tablename__ = "file_jobs"
+
+    # Очередь обработки вложений; переживает перезапуск приложения
+    id = Column(Integer, primary_key=True)
+    task_file_id = Column(Integer, ForeignKey("task_files.id"), nullable=False, index=True)
+    status = Column(String, nullable=False, default="pending")
+    attempts = Column(Integer, nullable=False, default=0)
+    error = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+    task_file = relationship("TaskFile")
+
+    __table_args__ = (
+        # Выборка следующей задачи очереди не читает выполненные
+        Index("ix_file_jobs_status_id", "status", "id"),
+    )
+
+
+class FileChunk(Base):
+    __tablename__ = "file_chunks"
+
+    # Фрагменты извлечённого текста вложения для поиска по содержимому
+    id = Column(Integer, primary_key=True)
+    task_file_id = Column(Integer, ForeignKey("task_files.id"), nullable=False, index=True)
+    task_id = Column(Integer, ForeignKey("tasks.id"), nullable=False, index=True)
+    position = Column(Integer, nullable=False)
+    content = Column(String, nullable=False)
+
+
+# Полнотекстовый индекс фрагментов, rowid = file_chunks.id (см. app/search.py)
+event.listen(
+    FileChunk.__table__,
+    "after_create",
+    DDL(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS file_chunks_fts USING fts5("
+        "content, tokenize='unicode61 remove_diacritics 2')"
+    ).execute_if(dialect="sqlite")
+)
+event.listen(
+    FileChunk.__table__,
+    "before_drop",
+    DDL("DROP TABLE IF EXISTS file_chunks_fts").execute_if(dialect="sqlite")
+)
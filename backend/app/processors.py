@@ -0,0 +1,122 @@
+import io
+import os
+import re
+import zipfile
+from typing import BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional
+from xml.etree import ElementTree
+from . import compression
+
+# Обработчики вложений для очереди app/jobs.py. Выполняются в отдельных
+# процессах (ProcessPoolExecutor), поэтому здесь только чистые функции без
+# обращений к БД и состоянию приложения. Текст читается потоково, строка за
+# строкой, и режется на фрагменты для поиска (search.index_file_chunks).
+# Обработчики получают исходные байты: сжатые на диске файлы распаковываются
+# при чтении (app/compression.py)
+
+PREVIEW_LENGTH = 500
+CHUNK_LENGTH = 2000  # символов во фрагменте
+MAX_TEXT_LENGTH = 4 * 1024 * 1024  # символов извлечённого текста на файл
+
+_SHEET_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_SHEET_RE = re.compile(r"^xl/worksheets/sheet(\d+)\.xml$")
+
+
+class Unsupported(Exception):
+    pass
+
+
+def _cell_text(cell, shared: List[str]) -> str:
+    kind = cell.get("t")
+    if kind == "inlineStr":
+        return "".join(node.text or "" for node in cell.iter(f"{_SHEET_NS}t"))
+    value = cell.find(f"{_SHEET_NS}v")
+    if value is None or value.text is None:
+        return ""
+    if kind == "s":
+        return shared[int(value.text)]
+    return value.text
+
+
+def xlsx_lines(source: BinaryIO) -> Iterator[str]:
+    # XLSX — zip с XML. Листы разбираются iterparse по строкам, разобранные
+    # элементы сразу освобождаются: книга целиком в память не попадает
+    with zipfile.ZipFile(source) as archive:
+        shared = []
+        if "xl/sharedStrings.xml" in archive.namelist():
+            with archive.open("xl/sharedStrings.xml") as part:
+                for _, item in ElementTree.iterparse(part):
+                    if item.tag == f"{_SHEET_NS}si":
+                        shared.append("".join(
+                            node.text or "" for node in item.iter(f"{_SHEET_NS}t")))
+                        item.clear()
+
+        sheets = sorted(
+            (int(match.group(1)), name) for name in archive.namelist()
+            if (match := _SHEET_RE.match(name)))
+        for _, name in sheets:
+            with archive.open(name) as part:
+                for _, row in ElementTree.iterparse(part):
+                    if row.tag != f"{_SHEET_NS}row":
+                        continue
+                    line = "\t".join(
+                        _cell_text(cell, shared) for cell in row.iter(f"{_SHEET_NS}c"))
+                    row.clear()
+                    yield line.rstrip("\t")
+
+
+def text_lines(source: BinaryIO) -> Iterator[str]:
+    for line in io.TextIOWrapper(source, encoding="utf-8-sig", errors="replace"):
+        yield line.rstrip("\r\n")
+
+
+def pdf_lines(source: BinaryIO) -> Iterator[str]:
+    # Необязательная зависимость: pip install my-tracker[pdf]
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        raise Unsupported(".pdf")
+    for page in PdfReader(source).pages:
+        yield from (page.extract_text() or "").splitlines()
+
+
+EXTRACTORS: Dict[str, Callable[[BinaryIO], Iterable[str]]] = {
+    ".xlsx": xlsx_lines,
+    ".pdf": pdf_lines,
+    ".csv": text_lines,
+    ".txt": text_lines,
+    ".md": text_lines,
+    ".json": text_lines,
+}
+
+
+def chunk_lines(lines: Iterable[str]) -> List[str]:
+    chunks, current, size, total = [], [], 0, 0
+    for line in lines:
+        if not line.strip():
+            continue
+        line = line[:CHUNK_LENGTH]
+        if size + len(line) > CHUNK_LENGTH and current:
+            chunks.append("\n".join(current))
+            current, size = [], 0
+        current.append(line)
+        size += len(line) + 1
+        total += len(line) + 1
+        if total >= MAX_TEXT_LENGTH:
+            break
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+
+def process_file(path: str, filename: str, encoding: Optional[str] = None) -> dict:
+    extension = os.path.splitext(filename)[1].lower()
+    extractor = EXTRACTORS.get(extension)
+    if extractor is None:
+        raise Unsupported(extension)
+    with compression.open_stored(path, encoding) as source:
+        chunks = chunk_lines(extractor(source))
+    head = chunks[0][:PREVIEW_LENGTH * 2] if chunks else ""
+    return {
+        "chunks": chunks,
+        "preview": " ".join(head.split())[:PREVIEW_LENGTH],
+    }
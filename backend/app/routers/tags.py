@@ -0,0 +1,24 @@
+from fastapi import APIRouter, Query, Response
+from typing import List
+from app import schemas, fastjson
+from app.database import read_session
+from app.tags import tag_index
+
+router = APIRouter()
+
+DEFAULT_TAG_LIMIT = 20
+MAX_TAG_LIMIT = 200
+
+
+@router.get("/", response_model=List[schemas.TagUsage])
+async def read_tags(
+    prefix: str = Query("", max_length=100),
+    limit: int = Query(DEFAULT_TAG_LIMIT, ge=1, le=MAX_TAG_LIMIT)
+):
+    # Ответ из индекса в памяти; БД читается только при (пере)загрузке.
+    # Строки уже в форме schemas.TagUsage, валидация pydantic не нужна
+    if tag_index.is_stale():
+        async with read_session() as db:
+            await tag_index.load(db)
+    return Response(fastjson.dumps(tag_index.search(prefix, limit)),
+                    media_type="application/json")
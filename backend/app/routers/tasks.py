@@ -1,23 +1,100 @@
-from fastapi import APIRouter, Depends, UploadFile, File, Form
-from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException
+from fastapi import APIRouter, Depends, UploadFile, File, Form, Header, HTTPException, Query, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import Optional, List
+from typing import Optional, List, Tuple
+import asyncio
 import os
-import shutil
 from sqlalchemy import update
-from app.models import Task
-from sqlalchemy.ext.asyncio import AsyncSession
-from app import schemas, crud
-from app.database import get_db
-from sqlalchemy.sql import select
-from fastapi.responses import FileResponse
+from app.models import Task, TaskFile
+from app import schemas, crud, bulk, storage, downloads, events, fastjson, metrics, stats, archive
+from app.config import settings
+from app.cache import task_cache
+from app.database import get_db, get_read_db, read_session
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import ValidationError
+from starlette.concurrency import run_in_threadpool
 from datetime import datetime
 
 router = APIRouter()
 
-UPLOAD_DIR = "uploads"
+UPLOAD_DIR = storage.UPLOAD_DIR
 MAX_FILE_SIZE = 20 * 1024 * 1024  # 20 МБ в байтах
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+BULK_BATCH_SIZE = 500
+MAX_BULK_BATCH_SIZE = 5000
+MAX_BULK_ERRORS = 1000
+
+
+def task_filters(
+    priority: Optional[schemas.Priority] = None,
+    status: Optional[schemas.Status] = None,
+    start_date_before: Optional[datetime] = None,
+    start_date_after: Optional[datetime] = None,
+    end_date_before: Optional[datetime] = None,
+    end_date_after: Optional[datetime] = None,
+    deadline_before: Optional[datetime] = None,
+    deadline_after: Optional[datetime] = None,
+    search: Optional[str] = None,
+    tag: Optional[str] = None,
+    search_files: bool = False
+) -> dict:
+    return dict(
+        priority=priority,
+        status=status,
+        start_date_before=start_date_before,
+        start_date_after=start_date_after,
+        end_date_before=end_date_before,
+        end_date_after=end_date_after,
+        deadline_before=deadline_before,
+        deadline_after=deadline_after,
+        search=search,
+        tag=tag,
+        search_files=search_files
+    )
+
+
+async def save_task_files(
+    db: AsyncSession,
+    files: List[UploadFile],
+    existing: Optional[List[TaskFile]] = None
+) -> List[Tuple[str, storage.StoredUpload]]:
+    names = {os.path.basename(file.file_path) for file in existing or []}
+
+    # Проверяем, не существует ли уже файл с таким именем
+    for file in files:
+        name = os.path.basename(file.filename)
+        if name in names:
+            raise HTTPException(
+                status_code=400,
+                detail=f"File '{file.filename}' already exists in this task"
+            )
+        names.add(name)
+
+    # Файлы пишутся параллельно, весь дисковый ввод-вывод — вне event loop
+    results = await asyncio.gather(
+        *(storage.save_upload(file, MAX_FILE_SIZE) for file in files),
+        return_exceptions=True
+    )
+
+    saved = [result for result in results
+             if isinstance(result, storage.StoredUpload)]
+    for file, result in zip(files, results):
+        if isinstance(result, storage.StoredUpload):
+            continue
+        try:
+            await crud.discard_unreferenced_blobs(db, saved)
+        finally:
+            await storage.release_uploads(saved)
+        if isinstance(result, storage.FileTooLarge):
+            raise HTTPException(
+                status_code=413,
+                detail=f"File '{file.filename}' is too large. Maximum size is 20MB"
+            )
+        raise result
+
+    # В задаче файл виден под своим именем, содержимое лежит в хранилище блобов
+    return [(os.path.basename(file.filename), upload)
+            for file, upload in zip(files, results)]
 
 
 @router.post("/", response_model=schemas.Task)
@@ -34,19 +111,15 @@ async def create_task(
     db: AsyncSession = Depends(get_db),
 ):
     # Валидация дат
-    if start_date and end_date and start_date > end_date:
-        raise HTTPException(
-            status_code=400,
-            detail="Start date cannot be later than end date"
-        )
-
-    if deadline and start_date and deadline < start_date:
-        raise HTTPException(
-            status_code=400,
-            detail="Deadline cannot be earlier than start date"
-        )
-
-    # 1. Создаем задачу
+    error = crud.date_error(start_date, end_date, deadline)
+    if error:
+        raise HTTPException(status_code=400, detail=error)
+
+    # 1. Сохраняем файлы, пока не занят пишущий коннект к БД (сессия
+    # берёт коннект только при первом запросе)
+    uploads = await save_task_files(db, files) if files else []
+
+    # 2. Создаем задачу вместе с записями файлов
     task_data = schemas.TaskCreate(
         title=title,
         description=description,
@@ -57,79 +130,159 @@ async def create_task(
         deadline=deadline,
         tags=tags or []
     )
-    task = await crud.create_task(db, task_data)
-
-    # 2. Если есть файлы, сохраняем их
-    if files:
-        # Создаем директорию для файлов задачи
-        task_dir = os.path.join(UPLOAD_DIR, str(task.id))
-        os.makedirs(task_dir, exist_ok=True)
-
-        saved_paths = []
-        for file in files:
-            # Проверка размера файла
-            file_size = 0
-            chunk_size = 1024 * 1024  # 1 МБ
-
-            while True:
-                chunk = await file.read(chunk_size)
-                if not chunk:
-                    break
-                file_size += len(chunk)
-                if file_size > MAX_FILE_SIZE:
-                    raise HTTPException(
-                        status_code=413,
-                        detail=f"File '{file.filename}' is too large. Maximum size is 20MB"
-                    )
-
-            await file.seek(0)
-
-            file_location = os.path.join(task_dir, file.filename)
-
-            # Проверяем, не существует ли уже файл с таким именем
-            if os.path.exists(file_location):
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"File '{file.filename}' already exists in this task"
-                )
-
-            with open(file_location, "wb") as buffer:
-                shutil.copyfileobj(file.file, buffer)
-
-            saved_paths.append(file_location)
-
-        # 3. Добавляем записи файлов в БД
-        await crud.add_files_to_task(db, task.id, saved_paths)
+    stored = [upload for _, upload in uploads]
+    try:
+        return await crud.create_task(db, task_data, uploads)
+    except Exception:
+        await db.rollback()
+        await crud.discard_unreferenced_blobs(db, stored)
+        raise
+    finally:
+        await storage.release_uploads(stored)
 
-    return task
+
+def task_list_response(rows: List[dict], headers: Optional[dict] = None) -> Response:
+    # Строки уже в форме schemas.Task: собираем JSON напрямую, без
+    # повторной валидации pydantic (response_model остаётся для OpenAPI)
+    with metrics.timed_serialization():
+        body = fastjson.dumps(rows)
+    return Response(body, media_type="application/json", headers=headers)
 
 
 @router.get("/", response_model=List[schemas.Task])
 async def read_tasks(
-    priority: Optional[schemas.Priority] = None,
-    status: Optional[schemas.Status] = None,
-    start_date_before: Optional[datetime] = None,
-    start_date_after: Optional[datetime] = None,
-    end_date_before: Optional[datetime] = None,
-    end_date_after: Optional[datetime] = None,
-    deadline_before: Optional[datetime] = None,
-    deadline_after: Optional[datetime] = None,
-    search: Optional[str] = None,
-    tag: Optional[str] = None,
+    filters: dict = Depends(task_filters),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    all_tasks: bool = Query(False, alias="all"),
+    db: AsyncSession = Depends(get_read_db)
+):
+    # Полный список без ограничений отдаём только по явному запросу
+    if all_tasks:
+        return task_list_response(await crud.get_task_rows(db, **filters))
+
+    try:
+        tasks, next_cursor = await crud.get_task_rows_page(
+            db, limit=limit, cursor=cursor, **filters)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+    return task_list_response(tasks, headers)
+
+
+def _validation_message(exc: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}"
+        for error in exc.errors()
+    )
+
+
+@router.patch("/batch", response_model=schemas.TaskBatchResult)
+async def batch_update_tasks(
+    changes: schemas.TaskBatchUpdate,
+    filters: dict = Depends(task_filters),
     db: AsyncSession = Depends(get_db)
 ):
-    return await crud.get_tasks(
-        db,
-        priority=priority,
-        status=status,
-        start_date_before=start_date_before,
-        start_date_after=start_date_after,
-        end_date_before=end_date_before,
-        end_date_after=end_date_after,
-        deadline_before=deadline_before,
-        deadline_after=deadline_after,
-        search=search,
-        tag=tag
+    # Задачи выбираются по ids из тела и/или фильтрам GET /tasks/;
+    # без того и другого запрос затронул бы всю таблицу
+    if changes.ids is None and not any(filters.values()):
+        raise HTTPException(status_code=400, detail="Specify ids or at least one filter")
+    if not (changes.patch.dict(exclude_unset=True) or changes.add_tags or changes.remove_tags):
+        raise HTTPException(status_code=400, detail="Nothing to update")
+    try:
+        updated = await crud.update_tasks_batch(db, changes, **filters)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    return {"updated": updated}
+
+
+@router.post("/bulk", response_model=schemas.BulkImportResult)
+async def bulk_import_tasks(
+    request: Request,
+    batch_size: int = Query(BULK_BATCH_SIZE, ge=1, le=MAX_BULK_BATCH_SIZE),
+    db: AsyncSession = Depends(get_db)
+):
+    # Тело читается потоком: NDJSON (по умолчанию) или CSV с заголовком
+    content_type = request.headers.get("content-type", "")
+    if "csv" in content_type:
+        rows = bulk.iter_csv(request.stream())
+    else:
+        rows = bulk.iter_ndjson(request.stream())
+
+    created = 0
+    errors = []
+    failed = 0
+    batch = []
+    batch_lines = []
+
+    def report(line: int, message: str):
+        nonlocal failed
+        failed += 1
+        if len(errors) < MAX_BULK_ERRORS:
+            errors.append(schemas.BulkImportError(line=line, error=message))
+
+    async def flush():
+        nonlocal created
+        try:
+            created += await crud.create_tasks_bulk(db, batch)
+        except Exception as exc:
+            await db.rollback()
+            for line in batch_lines:
+                report(line, f"Batch insert failed: {exc}")
+        batch.clear()
+        batch_lines.clear()
+
+    async for line, row, error in rows:
+        if error:
+            report(line, error)
+            continue
+        try:
+            task = schemas.TaskCreate(**row)
+        except ValidationError as exc:
+            report(line, _validation_message(exc))
+            continue
+        error = crud.date_error(task.start_date, task.end_date, task.deadline)
+        if error:
+            report(line, error)
+            continue
+
+        batch.append(task)
+        batch_lines.append(line)
+        if len(batch) >= batch_size:
+            await flush()
+
+    if batch:
+        await flush()
+
+    return schemas.BulkImportResult(created=created, failed=failed, errors=errors)
+
+
+@router.get("/export")
+async def export_tasks(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    batch_size: int = Query(BULK_BATCH_SIZE, ge=1, le=MAX_BULK_BATCH_SIZE),
+    filters: dict = Depends(task_filters)
+):
+    if format == "csv":
+        media_type = "text/csv; charset=utf-8"
+        header, encode = bulk.csv_header(), bulk.to_csv
+    else:
+        media_type = "application/x-ndjson"
+        header, encode = "", bulk.to_ndjson
+
+    async def generate():
+        # Своя сессия: зависимость get_db закрывается раньше, чем тело ответа
+        async with read_session() as db:
+            if header:
+                yield header
+            async for rows in crud.stream_tasks(db, batch_size, **filters):
+                yield encode([bulk.export_row(task, tags) for task, tags in rows])
+
+    return StreamingResponse(
+        generate(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="tasks.{format}"'}
     )
 
 
@@ -144,45 +297,103 @@ async def update_task_file_path(db: AsyncSession, task_id: int, file_path: str):
     await db.commit()
 
 
-@router.get("/{task_id}", response_model=schemas.Task)
-async def read_task(task_id: int, db: AsyncSession = Depends(get_db)):
-    task = await crud.get_task(db, task_id)
-    if task is None:
+@router.get("/changes", response_model=schemas.TaskChanges)
+async def read_changes(
+    since: Optional[str] = None,
+    limit: int = Query(BULK_BATCH_SIZE, ge=1, le=MAX_BULK_BATCH_SIZE),
+    db: AsyncSession = Depends(get_read_db)
+):
+    try:
+        return await crud.get_changes(db, since, limit)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid change token")
+
+
+@router.get("/stats", response_model=schemas.TaskStats)
+async def read_stats(db: AsyncSession = Depends(get_read_db)):
+    # Сводка из task_stats: стоимость зависит от числа групп, не задач
+    return await stats.get_stats(db)
+
+
+@router.get("/events")
+async def stream_events():
+    # Server-Sent Events: task.created, task.updated, task.deleted,
+    # tasks.created, files.added, file.deleted
+    return StreamingResponse(
+        events.sse_stream(events.broker, settings.event_heartbeat),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.get("/cache/stats")
+async def read_cache_stats():
+    return task_cache.stats()
+
+
+async def _cached_task(db: AsyncSession, task_id: int) -> dict:
+    payload = await task_cache.get_or_load(
+        task_id, lambda: crud.get_task_payload(db, task_id))
+    if payload is None:
         raise HTTPException(status_code=404, detail="Task not found")
-    return task
+    return payload
+
+
+def task_etag(version: int) -> str:
+    # Метка уникальна только вместе с URL: id задачи не выдаётся повторно
+    # (AUTOINCREMENT в SQLite, последовательность в PostgreSQL), поэтому
+    # версия 1 новой задачи не совпадёт с меткой удалённой
+    return f'"{version}"'
+
+
+def _if_match_version(if_match: Optional[str]) -> Optional[int]:
+    # None — условия нет (или «*»); -1 — ни одна метка не может совпасть
+    if if_match is None or if_match.strip() == "*":
+        return None
+    for tag in if_match.split(","):
+        tag = tag.strip()
+        # If-Match сравнивает только сильные метки
+        if tag.startswith('"') and tag.endswith('"') and tag[1:-1].isdigit():
+            return int(tag[1:-1])
+    return -1
+
+
+@router.get("/{task_id}", response_model=schemas.Task)
+async def read_task(
+    task_id: int,
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_read_db)
+):
+    payload = await _cached_task(db, task_id)
+    etag = task_etag(payload["version"])
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if if_none_match and etag in (
+            tag.strip().removeprefix("W/") for tag in if_none_match.split(",")):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(payload, headers=headers)
 
 
 @router.put("/{task_id}", response_model=schemas.Task)
 async def update_task(
     task_id: int,
     task_data: schemas.TaskUpdate,
+    response: Response,
+    if_match: Optional[str] = Header(None),
     db: AsyncSession = Depends(get_db)
 ):
-    # Получаем текущую задачу
-    current_task = await crud.get_task(db, task_id)
-    if current_task is None:
+    # If-Match: "<version>" из ETag — обновление только если задачу никто
+    # не изменил после чтения, иначе 412
+    try:
+        task = await crud.update_task(
+            db, task_id, task_data, expected_version=_if_match_version(if_match))
+    except crud.VersionConflict:
+        raise HTTPException(status_code=412, detail="Task was modified by another request")
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    if task is None:
         raise HTTPException(status_code=404, detail="Task not found")
 
-    # Валидация дат
-    update_data = task_data.dict(exclude_unset=True)
-
-    start_date = update_data.get('start_date', current_task.start_date)
-    end_date = update_data.get('end_date', current_task.end_date)
-    deadline = update_data.get('deadline', current_task.deadline)
-
-    if start_date and end_date and start_date > end_date:
-        raise HTTPException(
-            status_code=400,
-            detail="Start date cannot be later than end date"
-        )
-
-    if deadline and start_date and deadline < start_date:
-        raise HTTPException(
-            status_code=400,
-            detail="Deadline cannot be earlier than start date"
-        )
-
-    task = await crud.update_task(db, task_id, update_data)
+    response.headers["ETag"] = task_etag(task.version)
     return task
 
 
@@ -195,11 +406,9 @@ async def delete_task(task_id: int, db: AsyncSession = Depends(get_db)):
 
 
 @router.get("/{task_id}/files", response_model=List[schemas.TaskFile])
-async def get_task_files(task_id: int, db: AsyncSession = Depends(get_db)):
-    task = await crud.get_task(db, task_id)
-    if task is None:
-        raise HTTPException(status_code=404, detail="Task not found")
-    return task.files
+async def get_task_files(task_id: int, db: AsyncSession = Depends(get_read_db)):
+    payload = await _cached_task(db, task_id)
+    return JSONResponse(payload["files"])
 
 
 @router.delete("/{task_id}/files/{file_id}")
@@ -218,86 +427,91 @@ async def delete_task_file(
 async def upload_task_files(
     task_id: int,
     files: Optional[List[UploadFile]] = File(None, max_size=MAX_FILE_SIZE),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_db),
+    read_db: AsyncSession = Depends(get_read_db)
 ):
     # Проверяем существование задачи
-    task = await crud.get_task(db, task_id)
+    task = await crud.get_task(read_db, task_id)
     if task is None:
         raise HTTPException(status_code=404, detail="Task not found")
 
     if not files:
         return []
 
-    # Создаем директорию для файлов задачи, если её нет
-    task_dir = os.path.join(UPLOAD_DIR, str(task_id))
-    os.makedirs(task_dir, exist_ok=True)
+    uploads = await save_task_files(db, files, task.files)
 
-    saved_paths = []
-    for file in files:
-        # Дополнительная проверка размера файла
-        file_size = 0
-        chunk_size = 1024 * 1024  # 1 МБ
-
-        # Читаем файл по частям и проверяем размер
-        while True:
-            chunk = await file.read(chunk_size)
-            if not chunk:
-                break
-            file_size += len(chunk)
-            if file_size > MAX_FILE_SIZE:
-                raise HTTPException(
-                    status_code=413,
-                    detail=f"File '{file.filename}' is too large. Maximum size is 20MB"
-                )
-
-        # Сбрасываем указатель файла в начало
-        await file.seek(0)
-
-        file_location = os.path.join(task_dir, file.filename)
-
-        # Проверяем, не существует ли уже файл с таким именем
-        if os.path.exists(file_location):
-            raise HTTPException(
-                status_code=400,
-                detail=f"File '{file.filename}' already exists in this task"
-            )
-
-        # Сохраняем файл
-        with open(file_location, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+    # Добавляем записи файлов в БД
+    stored = [upload for _, upload in uploads]
+    try:
+        return await crud.add_files_to_task(db, task_id, uploads)
+    except Exception:
+        await db.rollback()
+        await crud.discard_unreferenced_blobs(db, stored)
+        raise
+    finally:
+        await storage.release_uploads(stored)
+
+
+@router.get("/{task_id}/files/archive")
+async def download_task_files_archive(
+    task_id: int,
+    file_ids: Optional[List[int]] = Query(None),
+    db: AsyncSession = Depends(get_read_db)
+):
+    # Все файлы задачи (или выбранные file_ids) одним ZIP-потоком
+    task = await crud.get_task(db, task_id)
+    if task is None:
+        raise HTTPException(status_code=404, detail="Task not found")
 
-        saved_paths.append(file_location)
+    files = task.files
+    if file_ids:
+        wanted = set(file_ids)
+        files = [file for file in files if file.id in wanted]
+        if len(files) != len(wanted):
+            raise HTTPException(status_code=404, detail="File not found")
+    if not files:
+        raise HTTPException(status_code=404, detail="File not found")
 
-    # Добавляем записи файлов в БД
-    return await crud.add_files_to_task(db, task_id, saved_paths)
+    paths = [storage.file_location(file) for file in files]
+    for path in paths:
+        if not await run_in_threadpool(os.path.isfile, path):
+            raise HTTPException(status_code=404, detail="File not found on disk")
+    names = archive.archive_names([os.path.basename(file.file_path) for file in files])
+    # Сжатые на диске файлы распаковываются в архив; размер — исходный
+    sizes = await crud.get_blob_sizes(
+        db, [file.sha256 for file in files if file.encoding])
+    entries = [
+        archive.Entry(path, name, file.encoding, sizes.get(file.sha256))
+        for path, name, file in zip(paths, names, files)
+    ]
+
+    return StreamingResponse(
+        archive.iter_zip(entries),
+        media_type="application/zip",
+        headers={"Content-Disposition": downloads.content_disposition(
+            f"task-{task_id}-files.zip")}
+    )
 
 
 @router.get("/{task_id}/files/{file_id}/download")
 async def download_task_file(
+    request: Request,
     task_id: int,
     file_id: int,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     # Получаем информацию о файле
-    query = select(models.TaskFile).where(
-        models.TaskFile.id == file_id,
-        models.TaskFile.task_id == task_id
-    )
-    result = await db.execute(query)
-    file = result.scalar_one_or_none()
-
+    file = await crud.get_task_file(db, task_id, file_id)
     if file is None:
         raise HTTPException(status_code=404, detail="File not found")
 
-    if not os.path.exists(file.file_path):
-        raise HTTPException(status_code=404, detail="File not found on disk")
-
     # Получаем имя файла из пути
     filename = os.path.basename(file.file_path)
 
-    # Возвращаем файл как поток
-    return FileResponse(
-        file.file_path,
-        media_type="application/octet-stream",
-        filename=filename
-    )
+    # Возвращаем файл как поток с поддержкой Range и условных запросов
+    try:
+        return await downloads.file_response(
+            request, storage.file_location(file), filename, file.sha256,
+            file.encoding, file.blob.size if file.blob else None)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="File not found on disk")
@@ -0,0 +1,141 @@
+import argparse
+import ast
+import asyncio
+import os
+import sys
+from typing import Optional
+from sqlalchemy import inspect, text
+from sqlalchemy.ext.asyncio import AsyncEngine
+from .models import Base
+
+# Схема базы при старте приложения (SCHEMA_MODE):
+#   check  — сверить ревизию Alembic в базе с head из migrations/ и не
+#            стартовать при расхождении (по умолчанию);
+#   create — create_all и stamp head для пустой базы (разработка, тесты);
+#   off    — ничего не проверять (проверка уже сделана при деплое).
+# Новая база: python -m app.schema init, дальше alembic upgrade head.
+
+MIGRATIONS_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "migrations")
+MODES = ("check", "create", "off")
+
+
+class SchemaError(RuntimeError):
+    pass
+
+
+def _script():
+    from alembic.script import ScriptDirectory
+    return ScriptDirectory(MIGRATIONS_DIR)
+
+
+def _literal(module: ast.Module, name: str):
+    for node in module.body:
+        if isinstance(node, (ast.Assign, ast.AnnAssign)):
+            targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+            if any(isinstance(target, ast.Name) and target.id == name for target in targets):
+                return ast.literal_eval(node.value)
+    return None
+
+
+def head_revision() -> str:
+    # revision/down_revision читаются из файлов миграций без импорта alembic
+    # (~0.1 с на каждый воркер): head — ревизия, на которую никто не ссылается
+    revisions, parents = set(), set()
+    versions = os.path.join(MIGRATIONS_DIR, "versions")
+    for name in os.listdir(versions):
+        if not name.endswith(".py"):
+            continue
+        with open(os.path.join(versions, name), encoding="utf-8") as source:
+            module = ast.parse(source.read(), name)
+        revisions.add(_literal(module, "revision"))
+        down = _literal(module, "down_revision")
+        parents.update(down if isinstance(down, (tuple, list)) else [down])
+    heads = revisions - parents
+    if len(heads) != 1:
+        raise SchemaError(f"Expected one migration head, found {sorted(heads)}")
+    return heads.pop()
+
+
+def _current_revision(connection) -> Optional[str]:
+    if not inspect(connection).has_table("alembic_version"):
+        return None
+    return connection.execute(text("SELECT version_num FROM alembic_version")).scalar()
+
+
+def _create_and_stamp(connection) -> bool:
+    from alembic.runtime.migration import MigrationContext
+    context = MigrationContext.configure(connection)
+    if context.get_current_revision() is not None:
+        return True
+    # Таблицы без ревизии — база из create_all старых версий: её состояние
+    # неизвестно, помечать её head нельзя
+    if inspect(connection).has_table("tasks"):
+        return False
+    Base.metadata.create_all(connection)
+    context.stamp(_script(), "head")
+    return True
+
+
+async def current_revision(engine: AsyncEngine) -> Optional[str]:
+    async with engine.connect() as conn:
+        return await conn.run_sync(_current_revision)
+
+
+async def check(engine: AsyncEngine):
+    current, head = await current_revision(engine), head_revision()
+    if current is None:
+        raise SchemaError(
+            "Database is not initialised: run `python -m app.schema init`")
+    if current != head:
+        raise SchemaError(
+            f"Database schema is at revision {current}, code expects {head}: "
+            "run `alembic upgrade head`")
+
+
+async def create(engine: AsyncEngine):
+    # Первая миграция рассчитана на существующие таблицы, поэтому пустая
+    # база создаётся по моделям и помечается текущей ревизией
+    async with engine.begin() as conn:
+        if not await conn.run_sync(_create_and_stamp):
+            raise SchemaError(
+                "Database has tables but no Alembic revision: stamp the revision "
+                "it matches (`alembic stamp <revision>`) and run `alembic upgrade head`")
+    await check(engine)
+
+
+async def prepare(engine: AsyncEngine, mode: str):
+    if mode == "check":
+        await check(engine)
+    elif mode == "create":
+        await create(engine)
+    elif mode != "off":
+        raise SchemaError(f"Unknown SCHEMA_MODE {mode!r}, expected one of {MODES}")
+
+
+async def _run(command: str) -> int:
+    from .database import engine, dispose_engines
+    try:
+        if command == "init":
+            await create(engine)
+        else:
+            await check(engine)
+    except SchemaError as exc:
+        print(exc, file=sys.stderr)
+        return 1
+    finally:
+        await dispose_engines()
+    print(f"schema is at head revision {head_revision()}")
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m app.schema", description="Database schema state")
+    parser.add_argument("command", choices=["check", "init"])
+    args = parser.parse_args()
+    return asyncio.run(_run(args.command))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Dict, List, Optional
 from datetime import datetime
 from enum import Enum
 
@@ -27,6 +27,11 @@ class TagCreate(TagBase):
     pass
 
 
+class TagUsage(TagBase):
+    # Число задач с тегом
+    count: int
+
+
 class Tag(TagBase):
     id: int
 
@@ -37,6 +42,8 @@ class Tag(TagBase):
 class TaskFile(BaseModel):
     id: int
     file_path: str
+    processing_status: Optional[str] = None
+    preview: Optional[str] = None
 
     class Config:
         orm_mode = True
@@ -70,11 +77,61 @@ class TaskUpdate(BaseModel):
         orm_mode = True
 
 
+class TaskPatch(BaseModel):
+    # Поля, которые PATCH /tasks/batch выставляет всем выбранным задачам
+    priority: Optional[Priority] = None
+    status: Optional[Status] = None
+    start_date: Optional[datetime] = None
+    end_date: Optional[datetime] = None
+    deadline: Optional[datetime] = None
+
+
+class TaskBatchUpdate(BaseModel):
+    # Без ids изменяются задачи, подходящие под фильтры запроса (как в GET /tasks/)
+    ids: Optional[List[int]] = None
+    patch: TaskPatch = TaskPatch()
+    add_tags: List[str] = []
+    remove_tags: List[str] = []
+
+
+class TaskBatchResult(BaseModel):
+    updated: int
+
+
 class Task(TaskBase):
     id: int
     created_at: datetime
+    updated_at: Optional[datetime] = None
+    version: Optional[int] = None
     files: List[TaskFile] = []
     tags: List[Tag] = []
 
     class Config:
         orm_mode = True
+
+
+class BulkImportError(BaseModel):
+    line: int
+    error: str
+
+
+class BulkImportResult(BaseModel):
+    created: int
+    failed: int
+    errors: List[BulkImportError] = []
+
+
+class TaskChanges(BaseModel):
+    changed: List[Task] = []
+    deleted: List[int] = []
+    next_token: str
+    has_more: bool = False
+
+
+class TaskStats(BaseModel):
+    total: int
+    by_status: Dict[str, int] = {}
+    by_priority: Dict[str, int] = {}
+    by_tag: Dict[str, int] = {}
+    # overdue / today / week (ближайшие 7 дней) / later, без выполненных
+    deadlines: Dict[str, int] = {}
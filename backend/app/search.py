@@ -0,0 +1,119 @@
+import re
+from typing import List, Optional
+from sqlalchemy import column, delete, insert, literal_column, select, table
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import models
+from .database import IS_SQLITE
+
+# Полнотекстовый индекс задач и текста вложений (SQLite FTS5). Таблицы
+# создаются DDL-событиями в models.py и миграциями, синхронизируются из crud
+# и app/jobs.py. На других СУБД индекса нет, и поиск идёт через ilike.
+enabled = IS_SQLITE
+tasks_fts = table(
+    "tasks_fts",
+    column("rowid"),
+    column("title"),
+    column("description"),
+    column("rank"),
+)
+file_chunks_fts = table(
+    "file_chunks_fts",
+    column("rowid"),
+    column("content"),
+)
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def normalize(text: Optional[str]) -> str:
+    # unicode61 сворачивает регистр кириллицы, но не считает «ё» и «е» одной буквой
+    return (text or "").replace("ё", "е").replace("Ё", "Е")
+
+
+def match_query(search: str) -> Optional[str]:
+    if not enabled:
+        return None
+    # Каждое слово ищем по префиксу: «перв» находит «Первая»
+    tokens = _TOKEN_RE.findall(normalize(search))
+    if not tokens:
+        return None
+    return " ".join(f'"{token}"*' for token in tokens)
+
+
+def matches(match: str):
+    return select(tasks_fts.c.rowid).where(
+        literal_column("tasks_fts").match(match))
+
+
+def ranked(match: str):
+    # bm25: чем меньше rank, тем релевантнее
+    return select(tasks_fts.c.rowid, tasks_fts.c.rank).where(
+        literal_column("tasks_fts").match(match)).cte("ranked")
+
+
+async def index_tasks(db: AsyncSession, tasks: List[models.Task]):
+    # Для новых задач: строк в индексе ещё нет, удалять нечего
+    if not enabled or not tasks:
+        return
+    await db.execute(insert(tasks_fts), [
+        {
+            "rowid": task.id,
+            "title": normalize(task.title),
+            "description": normalize(task.description),
+        }
+        for task in tasks
+    ])
+
+
+async def index_task(db: AsyncSession, task: models.Task):
+    await unindex_task(db, task.id)
+    await index_tasks(db, [task])
+
+
+async def unindex_task(db: AsyncSession, task_id: int):
+    if not enabled:
+        return
+    await db.execute(delete(tasks_fts).where(tasks_fts.c.rowid == task_id))
+
+
+def file_matches(search: str):
+    # id задач, во вложениях которых встречается запрос
+    chunks = select(models.FileChunk.task_id)
+    match = match_query(search)
+    if match:
+        return chunks.where(models.FileChunk.id.in_(
+            select(file_chunks_fts.c.rowid).where(
+                literal_column("file_chunks_fts").match(match))))
+    return chunks.where(models.FileChunk.content.ilike(f"%{search}%"))
+
+
+async def index_file_chunks(db: AsyncSession, task_file_id: int, task_id: int, chunks: List[str]):
+    await unindex_files(db, [task_file_id])
+    if not chunks:
+        return
+    result = await db.execute(
+        insert(models.FileChunk).returning(
+            models.FileChunk.id, sort_by_parameter_order=True),
+        [
+            {"task_file_id": task_file_id, "task_id": task_id,
+             "position": position, "content": content}
+            for position, content in enumerate(chunks)
+        ]
+    )
+    if enabled:
+        await db.execute(insert(file_chunks_fts), [
+            {"rowid": chunk_id, "content": normalize(content)}
+            for chunk_id, content in zip(result.scalars().all(), chunks)
+        ])
+
+
+async def unindex_files(db: AsyncSession, file_ids: List[int]):
+    if not file_ids:
+        return
+    chunk_ids = select(models.FileChunk.id).where(
+        models.FileChunk.task_file_id.in_(file_ids))
+    if enabled:
+        await db.execute(delete(file_chunks_fts).where(
+            file_chunks_fts.c.rowid.in_(chunk_ids)))
+    await db.execute(delete(models.FileChunk).where(
+        models.FileChunk.task_file_id.in_(file_ids)))
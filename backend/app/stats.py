@@ -0,0 +1,163 @@
+import argparse
+import asyncio
+import sys
+from collections import Counter
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, Optional
+from sqlalchemy import delete, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import models, schemas
+from .database import upsert
+
+# Сводные счётчики задач в таблице task_stats. crud меняет их в той же
+# транзакции, что и сами задачи, поэтому GET /tasks/stats читает несколько
+# десятков строк вместо всей таблицы tasks. При расхождении:
+#   python -m app.stats rebuild
+
+STATUS = "status"
+PRIORITY = "priority"
+TAG = "tag"
+DEADLINE = "deadline"
+DEADLINE_BUCKETS = ("overdue", "today", "week", "later")
+
+
+def task_keys(
+    status: Optional[schemas.Status],
+    priority: Optional[schemas.Priority],
+    deadline: Optional[datetime],
+    tag_names: Iterable[str]
+) -> Counter:
+    keys = Counter()
+    if status:
+        keys[STATUS, status.value] += 1
+    if priority:
+        keys[PRIORITY, priority.value] += 1
+    for name in tag_names:
+        keys[TAG, name] += 1
+    # Сроки считаем только у незавершённых задач, с точностью до дня
+    if deadline and status != schemas.Status.DONE:
+        keys[DEADLINE, deadline.date().isoformat()] += 1
+    return keys
+
+
+def keys_of(task: models.Task) -> Counter:
+    # Связь tags должна быть загружена
+    return task_keys(task.status, task.priority, task.deadline,
+                     [tag.name for tag in task.tags])
+
+
+def changes(old: Counter, new: Counter) -> Counter:
+    # new - old с отрицательными значениями (оператор «-» их отбрасывает)
+    delta = Counter(new)
+    delta.subtract(old)
+    return delta
+
+
+async def apply(db: AsyncSession, delta: Counter):
+    # Один upsert на все изменённые счётчики: count + delta
+    changes = [
+        {"dimension": dimension, "key": key, "count": count}
+        for (dimension, key), count in delta.items() if count
+    ]
+    if not changes:
+        return
+    stmt = upsert(models.TaskStat)
+    await db.execute(stmt.on_conflict_do_update(
+        index_elements=["dimension", "key"],
+        set_={"count": models.TaskStat.count + stmt.excluded.count}
+    ), changes)
+    if any(change["count"] < 0 for change in changes):
+        await db.execute(delete(models.TaskStat).where(models.TaskStat.count <= 0))
+
+
+def _day(value) -> str:
+    # SQLite возвращает date() строкой, PostgreSQL — объектом date
+    return value if isinstance(value, str) else value.isoformat()
+
+
+async def rebuild(db: AsyncSession) -> int:
+    counts = Counter()
+    task = models.Task
+
+    for status, count in await db.execute(
+            select(task.status, func.count()).group_by(task.status)):
+        if status:
+            counts[STATUS, status.value] += count
+    for priority, count in await db.execute(
+            select(task.priority, func.count()).group_by(task.priority)):
+        if priority:
+            counts[PRIORITY, priority.value] += count
+    for name, count in await db.execute(
+            select(models.Tag.name, func.count())
+            .join(models.task_tags, models.task_tags.c.tag_id == models.Tag.id)
+            .group_by(models.Tag.name)):
+        counts[TAG, name] += count
+    day = func.date(task.deadline)
+    for value, count in await db.execute(
+            select(day, func.count())
+            .where(task.deadline.is_not(None),
+                   or_(task.status.is_(None), task.status != schemas.Status.DONE))
+            .group_by(day)):
+        counts[DEADLINE, _day(value)] += count
+
+    await db.execute(delete(models.TaskStat))
+    await apply(db, counts)
+    await db.commit()
+    return len(counts)
+
+
+def _bucket(day: str, today: date) -> str:
+    value = date.fromisoformat(day)
+    if value < today:
+        return "overdue"
+    if value == today:
+        return "today"
+    if value <= today + timedelta(days=7):
+        return "week"
+    return "later"
+
+
+async def get_stats(db: AsyncSession, today: Optional[date] = None) -> dict:
+    today = today or datetime.utcnow().date()
+    groups: Dict[str, Dict[str, int]] = {
+        STATUS: {}, PRIORITY: {}, TAG: {}, DEADLINE: dict.fromkeys(DEADLINE_BUCKETS, 0)}
+
+    result = await db.execute(select(
+        models.TaskStat.dimension, models.TaskStat.key, models.TaskStat.count
+    ).where(models.TaskStat.count > 0))
+    for dimension, key, count in result:
+        if dimension == DEADLINE:
+            groups[DEADLINE][_bucket(key, today)] += count
+        elif dimension in groups:
+            groups[dimension][key] = count
+
+    return {
+        "total": sum(groups[STATUS].values()),
+        "by_status": groups[STATUS],
+        "by_priority": groups[PRIORITY],
+        "by_tag": groups[TAG],
+        "deadlines": groups[DEADLINE],
+    }
+
+
+async def _rebuild():
+    from .database import async_session, dispose_engines
+    try:
+        async with async_session() as db:
+            rows = await rebuild(db)
+    finally:
+        await dispose_engines()
+    print(f"task_stats rebuilt: {rows} counters")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m app.stats", description="Task statistics counters")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.parse_args()
+    asyncio.run(_rebuild())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
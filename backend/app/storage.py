@@ -0,0 +1,187 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+from fastapi import UploadFile
+from starlette.concurrency import run_in_threadpool
+from . import compression, metrics
+from .config import settings
+
+# Каталоги создаются при первой записи, не при импорте
+UPLOAD_DIR = settings.upload_dir
+# Содержимое вложений хранится один раз, по sha256: blobs/ab/cdef...
+# (blobs/ab/cdef....gz при FILE_COMPRESSION, см. app/compression.py)
+BLOB_DIR = os.path.join(UPLOAD_DIR, "blobs")
+CHUNK_SIZE = 1024 * 1024  # 1 МБ
+# None — без сжатия; неизвестный кодек или нет пакета — ошибка при старте
+CODEC = compression.check(settings.file_compression)
+
+
+class FileTooLarge(Exception):
+    pass
+
+
+@dataclass
+class StoredUpload:
+    path: str
+    size: int
+    sha256: str
+    encoding: Optional[str] = None
+    # Вторая ссылка на сохранённые байты (кодек spare_encoding) — держится до
+    # конца транзакции с записью файла: если очистка удалит блоб раньше,
+    # ensure_blobs восстановит его отсюда
+    spare_path: Optional[str] = None
+    spare_encoding: Optional[str] = None
+
+
+def _write_chunk(out, digest, chunk: bytes, compressor=None):
+    # hashlib, zlib и запись на диск отпускают GIL: выполняем их в пуле потоков
+    digest.update(chunk)
+    out.write(compressor.compress(chunk) if compressor else chunk)
+
+
+def _finish_write(out, compressor=None):
+    # Хвост сжатого потока и сброс буфера при закрытии — тоже блокирующие
+    try:
+        if compressor:
+            out.write(compressor.flush())
+    finally:
+        out.close()
+
+
+def task_file_path(task_id: int, name: str) -> str:
+    # Путь, под которым файл виден в задаче (TaskFile.file_path)
+    return os.path.join(UPLOAD_DIR, str(task_id), name)
+
+
+def blob_path(sha256: str, encoding: Optional[str] = None) -> str:
+    return os.path.join(BLOB_DIR, sha256[:2], sha256[2:]) + compression.SUFFIXES[encoding]
+
+
+def blob_paths(sha256: str) -> List[str]:
+    # Все возможные пути блоба: при удалении кодек неизвестен
+    return [blob_path(sha256, encoding) for encoding in compression.SUFFIXES]
+
+
+def file_location(task_file) -> str:
+    # Старые записи хранят файл по file_path, новые — в хранилище по хешу
+    if task_file.sha256:
+        return blob_path(task_file.sha256, task_file.encoding)
+    return task_file.file_path
+
+
+def _link_into_place(tmp_path: str, destination: str):
+    # Одинаковое содержимое даёт одинаковый путь, поэтому существующий блоб
+    # оставляем; временный файл остаётся запасной ссылкой (spare_path)
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    try:
+        os.link(tmp_path, destination)
+    except FileExistsError:
+        pass
+
+
+def _decompress_in_place(path: str, encoding: str):
+    raw_path = path + ".raw"
+    try:
+        with compression.open_stored(path, encoding) as source, open(raw_path, "wb") as out:
+            shutil.copyfileobj(source, out, CHUNK_SIZE)
+        os.replace(raw_path, path)
+    finally:
+        _discard(raw_path)
+
+
+def _place_blob(tmp_path: str, sha256: str, encoding: Optional[str],
+                size: int) -> Tuple[Optional[str], Optional[str]]:
+    # Кодек блоба в хранилище и кодек временного файла. Один sha256 — один
+    # файл: блоб, уже сохранённый другим кодеком (после смены
+    # FILE_COMPRESSION), переиспользуется
+    for existing in compression.SUFFIXES:
+        if existing != encoding and os.path.exists(blob_path(sha256, existing)):
+            return existing, encoding
+    if encoding and os.path.getsize(tmp_path) > size * compression.MAX_RATIO:
+        # Сжатие не окупилось: храним исходные байты
+        _decompress_in_place(tmp_path, encoding)
+        encoding = None
+    _link_into_place(tmp_path, blob_path(sha256, encoding))
+    return encoding, encoding
+
+
+def _stored_encoding(sha256: str) -> Optional[str]:
+    for encoding in compression.SUFFIXES:
+        if os.path.exists(blob_path(sha256, encoding)):
+            return encoding
+    raise FileNotFoundError(blob_path(sha256))
+
+
+def ensure_blobs(uploads: List[StoredUpload]):
+    # Вызывается в транзакции, которая уже держит блокировку записи на
+    # file_blobs: удалить блоб теперь может только очистка после нас
+    for upload in uploads:
+        if os.path.exists(upload.path):
+            continue
+        try:
+            encoding = _stored_encoding(upload.sha256)
+        except FileNotFoundError:
+            if upload.spare_path is None:
+                raise
+            encoding = upload.spare_encoding
+            _link_into_place(upload.spare_path, blob_path(upload.sha256, encoding))
+        upload.encoding, upload.path = encoding, blob_path(upload.sha256, encoding)
+
+
+def _discard(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+async def save_upload(file: UploadFile, max_size: int) -> StoredUpload:
+    # Один проход по загрузке: пишем во временный файл, считаем размер и
+    # sha256, при превышении лимита прерываемся, затем атомарно ссылаемся
+    # на него из хранилища по хешу содержимого. Вызывающий код освобождает
+    # временный файл через release_uploads
+    await run_in_threadpool(os.makedirs, BLOB_DIR, exist_ok=True)
+    fd, tmp_path = await run_in_threadpool(
+        tempfile.mkstemp, dir=BLOB_DIR, prefix=".upload-")
+
+    digest = hashlib.sha256()
+    size = 0
+    started = time.perf_counter()
+    out = os.fdopen(fd, "wb")
+    try:
+        # Сжимаем на лету, хеш считаем по исходным байтам
+        encoding = compression.choose(file.filename or "", CODEC)
+        compressor = compression.compressor(encoding) if encoding else None
+        while True:
+            chunk = await file.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_size:
+                raise FileTooLarge(file.filename)
+            await run_in_threadpool(_write_chunk, out, digest, chunk, compressor)
+        await run_in_threadpool(_finish_write, out, compressor)
+        sha256 = digest.hexdigest()
+        stored, spare = await run_in_threadpool(_place_blob, tmp_path, sha256, encoding, size)
+    except BaseException:
+        await run_in_threadpool(out.close)
+        await run_in_threadpool(_discard, tmp_path)
+        raise
+
+    metrics.record_transfer("upload", size, time.perf_counter() - started)
+    return StoredUpload(path=blob_path(sha256, stored), size=size, sha256=sha256,
+                        encoding=stored, spare_path=tmp_path, spare_encoding=spare)
+
+
+async def release_uploads(uploads: List[StoredUpload]):
+    # После commit или отката записи файлов запасные ссылки не нужны
+    await remove_files([upload.spare_path for upload in uploads if upload.spare_path])
+
+
+async def remove_files(paths):
+    for path in paths:
+        await run_in_threadpool(_discard, path)
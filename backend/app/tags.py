@@ -0,0 +1,76 @@
+import time
+from bisect import bisect_left, insort
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import and_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import models, stats
+from .config import settings
+from .search import normalize
+
+# Каталог тегов для автодополнения GET /tags. Все имена лежат в памяти
+# процесса в отсортированном списке: поиск по префиксу — bisect плюс срез,
+# без запросов к БД. Число задач с тегом берётся из task_stats (см.
+# app/stats.py), загружается при старте и обновляется из crud после commit.
+
+
+def _key(name: str) -> str:
+    # Без учёта регистра и разницы «ё»/«е»
+    return normalize(name).casefold()
+
+
+class TagIndex:
+    def __init__(self, refresh: float = 0):
+        # refresh > 0: индекс перечитывается из БД не реже раза в refresh
+        # секунд (изменения из других воркеров)
+        self.refresh = refresh
+        self._entries: List[Tuple[str, str]] = []  # (ключ, имя), по возрастанию
+        self._counts: Dict[str, int] = {}
+        self._loaded_at: Optional[float] = None
+
+    async def load(self, db: AsyncSession):
+        result = await db.execute(
+            select(models.Tag.name, models.TaskStat.count)
+            .outerjoin(models.TaskStat, and_(
+                models.TaskStat.dimension == stats.TAG,
+                models.TaskStat.key == models.Tag.name))
+        )
+        counts = {name: max(count or 0, 0) for name, count in result}
+        self._entries = sorted((_key(name), name) for name in counts)
+        self._counts = counts
+        self._loaded_at = time.monotonic()
+
+    def is_stale(self) -> bool:
+        if self._loaded_at is None:
+            return True
+        return self.refresh > 0 and time.monotonic() - self._loaded_at > self.refresh
+
+    def apply(self, delta: Counter):
+        # Дельта счётчиков из crud (stats.changes/_stat_keys); новые теги
+        # появляются в ней с положительным значением
+        if self._loaded_at is None:
+            return
+        for (dimension, name), count in delta.items():
+            if dimension != stats.TAG or not count:
+                continue
+            if name not in self._counts:
+                self._counts[name] = 0
+                insort(self._entries, (_key(name), name))
+            # Тег без задач остаётся в каталоге с нулём, как и в таблице tags
+            self._counts[name] = max(self._counts[name] + count, 0)
+
+    def search(self, prefix: str, limit: int) -> List[dict]:
+        key = _key(prefix)
+        start = bisect_left(self._entries, (key,))
+        found = []
+        for entry_key, name in self._entries[start:start + limit]:
+            if not entry_key.startswith(key):
+                break
+            found.append({"name": name, "count": self._counts[name]})
+        return found
+
+    def __len__(self):
+        return len(self._entries)
+
+
+tag_index = TagIndex(settings.tag_index_refresh)
@@ -0,0 +1,199 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+
+# Запуск из каталога backend:
+#   python -m benchmarks run --tasks 10000 --tags 200 --files 500 --out base.json
+#   python -m benchmarks run --database postgresql+asyncpg://.../bench_db --out pg.json
+#   python -m benchmarks compare base.json new.json --threshold 0.15
+#   python -m benchmarks plans
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _git_revision() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+            stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+class NotEmpty(Exception):
+    pass
+
+
+async def _ensure_empty():
+    # Бенчмарк создаёт задачи с id 1..N и изменяет/удаляет их: на базе с
+    # данными он переписал бы чужие задачи
+    from sqlalchemy import inspect, select
+    from app import models
+    from app.database import engine
+
+    async with engine.connect() as conn:
+        if not await conn.run_sync(lambda sync: inspect(sync).has_table("tasks")):
+            return
+        if await conn.scalar(select(models.Task.id).limit(1)) is not None:
+            raise NotEmpty(engine.url.render_as_string(hide_password=True))
+
+
+async def _run(args) -> dict:
+    from . import crud_bench, datagen, load
+    from .stats import Timer, peak_rss_mb
+
+    if args.database:
+        await _ensure_empty()
+    with Timer() as generation:
+        data = await datagen.generate(args.tasks, args.tags, args.files, args.seed)
+
+    results = {}
+    if "crud" in args.suites:
+        results.update(await crud_bench.run(data, args.iterations, args.seed))
+    if "http" in args.suites:
+        results.update(await load.run(data, args.requests, args.concurrency, args.seed))
+
+    return {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat(),
+            "revision": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "tasks": args.tasks,
+            "tags": args.tags,
+            "files": args.files,
+            "iterations": args.iterations,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "seed": args.seed,
+            "generation_s": generation.elapsed,
+            "peak_rss_mb": peak_rss_mb(),
+        },
+        "results": results,
+    }
+
+
+def run(args) -> int:
+    # Отдельная база и каталог вложений на каждый прогон. DATABASE_URL из
+    # окружения не используется: другая база — только явным --database, и
+    # только пустая
+    workdir = tempfile.mkdtemp(prefix="tracker-bench-")
+    os.environ["DATABASE_URL"] = args.database or (
+        f"sqlite+aiosqlite:///{os.path.join(workdir, 'bench.db')}")
+    os.environ["UPLOAD_DIR"] = os.path.join(workdir, "uploads")
+    sys.path.insert(0, BACKEND_DIR)
+    os.chdir(workdir)
+
+    try:
+        report = asyncio.run(_run(args))
+    except NotEmpty as exc:
+        print(f"refusing to benchmark non-empty database {exc}", file=sys.stderr)
+        return 2
+    with open(args.out, "w", encoding="utf-8") as out:
+        json.dump(report, out, ensure_ascii=False, indent=2)
+
+    for name, result in report["results"].items():
+        print(f"{name:45} p50 {result['p50_ms']:8.2f} ms  p95 {result['p95_ms']:8.2f} ms  "
+              f"p99 {result['p99_ms']:8.2f} ms  {result['throughput_rps']:9.1f} rps  "
+              f"errors {result['errors']}")
+    print(f"peak RSS {report['meta']['peak_rss_mb']:.1f} MB -> {args.out}")
+    return 0
+
+
+def compare(args) -> int:
+    with open(args.baseline, encoding="utf-8") as source:
+        baseline = json.load(source)["results"]
+    with open(args.candidate, encoding="utf-8") as source:
+        candidate = json.load(source)["results"]
+
+    regressions = []
+    for name in sorted(set(baseline) | set(candidate)):
+        if name not in baseline or name not in candidate:
+            print(f"{name:45} only in {'baseline' if name in baseline else 'candidate'}")
+            continue
+        old, new = baseline[name], candidate[name]
+        p95_change = (new["p95_ms"] - old["p95_ms"]) / old["p95_ms"] if old["p95_ms"] else 0.0
+        rps_change = ((new["throughput_rps"] - old["throughput_rps"]) / old["throughput_rps"]
+                      if old["throughput_rps"] else 0.0)
+        # Доли миллисекунды — шум, их не считаем регрессией
+        slower = (p95_change > args.threshold
+                  and new["p95_ms"] - old["p95_ms"] > args.min_ms)
+        regressed = slower or -rps_change > args.threshold or new["errors"] > old["errors"]
+        if regressed:
+            regressions.append(name)
+        print(f"{name:45} p95 {old['p95_ms']:8.2f} -> {new['p95_ms']:8.2f} ms ({p95_change:+.0%})  "
+              f"rps {old['throughput_rps']:9.1f} -> {new['throughput_rps']:9.1f} ({rps_change:+.0%})"
+              f"{'  REGRESSION' if regressed else ''}")
+
+    if regressions:
+        print(f"{len(regressions)} regression(s) above {args.threshold:.0%}")
+        return 1
+    print("no regressions")
+    return 0
+
+
+def plans(args) -> int:
+    sys.path.insert(0, BACKEND_DIR)
+    from .query_plans import check, full_scans
+
+    failures = check()
+    for name, filtered, plan in failures:
+        print(f"{name}: full scan")
+        for line in plan:
+            print(f"    {line}{'  <-' if line in full_scans(plan, filtered) else ''}")
+    if failures:
+        print(f"{len(failures)} query plan(s) with full table scans")
+        return 1
+    print("no full table scans")
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks", description="Benchmarks for the tasks API")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="generate data and run benchmarks")
+    run_parser.add_argument("--tasks", type=int, default=10000)
+    run_parser.add_argument("--tags", type=int, default=200)
+    run_parser.add_argument("--files", type=int, default=500)
+    run_parser.add_argument("--iterations", type=int, default=200,
+                            help="calls per crud benchmark")
+    run_parser.add_argument("--requests", type=int, default=500,
+                            help="requests per HTTP scenario")
+    run_parser.add_argument("--concurrency", type=int, default=8)
+    run_parser.add_argument("--suites", nargs="+", choices=["crud", "http"],
+                            default=["crud", "http"])
+    run_parser.add_argument("--seed", type=int, default=42)
+    run_parser.add_argument("--database",
+                            help="empty database URL (default: temporary SQLite file)")
+    run_parser.add_argument("--out", default="bench_results.json")
+    run_parser.set_defaults(handler=run)
+
+    compare_parser = commands.add_parser("compare", help="compare two result files")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("candidate")
+    compare_parser.add_argument("--threshold", type=float, default=0.15,
+                                help="allowed relative slowdown (0.15 = 15%%)")
+    compare_parser.add_argument("--min-ms", type=float, default=0.5,
+                                help="ignore p95 changes smaller than this")
+    compare_parser.set_defaults(handler=compare)
+
+    plans_parser = commands.add_parser(
+        "plans", help="check query plans of every filter combination")
+    plans_parser.set_defaults(handler=plans)
+
+    args = parser.parse_args()
+    if args.command == "run":
+        args.out = os.path.abspath(args.out)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,103 @@
+import random
+import time
+from typing import Awaitable, Callable, Dict
+from .stats import Timer, summarize
+
+# Микробенчмарки функций app.crud на сгенерированных данных
+
+
+async def run(data: dict, iterations: int, seed: int = 42) -> Dict[str, dict]:
+    from app import crud, schemas, stats as task_stats
+    from app.database import async_session, read_session
+
+    rng = random.Random(seed)
+    task_ids = data["task_ids"]
+    tag_names = data["tag_names"]
+    file_ids = data["file_ids"]
+    results = {}
+    created = []
+
+    async def bench(
+        name: str,
+        call: Callable[..., Awaitable],
+        session_factory=read_session,
+        count: int = iterations
+    ):
+        latencies = []
+        errors = 0
+        with Timer() as total:
+            for index in range(count):
+                async with session_factory() as db:
+                    started = time.perf_counter()
+                    try:
+                        await call(db, index)
+                    except Exception:
+                        errors += 1
+                    latencies.append(time.perf_counter() - started)
+        results[f"crud.{name}"] = summarize(latencies, total.elapsed, errors)
+
+    async def export_all(db, _):
+        async for _rows in crud.stream_tasks(db, 500):
+            pass
+
+    async def create(db, index):
+        task = await crud.create_task(db, schemas.TaskCreate(
+            title=f"Бенчмарк {index}", description="создание задачи",
+            tags=rng.sample(tag_names, k=min(3, len(tag_names)))))
+        created.append(task.id)
+
+    async def create_bulk(db, index):
+        await crud.create_tasks_bulk(db, [
+            schemas.TaskCreate(title=f"Пачка {index}-{row}", description="bulk",
+                               tags=rng.sample(tag_names, k=min(2, len(tag_names))))
+            for row in range(100)
+        ])
+
+    async def update(db, index):
+        await crud.update_task(db, rng.choice(task_ids), schemas.TaskUpdate(
+            status=rng.choice(list(schemas.Status)),
+            tags=rng.sample(tag_names, k=min(2, len(tag_names)))))
+
+    async def update_batch(db, index):
+        await crud.update_tasks_batch(db, schemas.TaskBatchUpdate(
+            ids=rng.sample(task_ids, k=min(500, len(task_ids))),
+            patch=schemas.TaskPatch(status=rng.choice(list(schemas.Status))),
+            add_tags=rng.sample(tag_names, k=1)))
+
+    async def delete(db, index):
+        if created:
+            await crud.delete_task(db, created.pop())
+
+    await bench("get_tasks_page", lambda db, _: crud.get_tasks_page(db, limit=50))
+    await bench("get_tasks_page[status]", lambda db, _: crud.get_tasks_page(
+        db, limit=50, status=rng.choice(list(schemas.Status))))
+    await bench("get_tasks_page[tag]", lambda db, _: crud.get_tasks_page(
+        db, limit=50, tag=rng.choice(tag_names)))
+    await bench("get_tasks_page[search]", lambda db, _: crud.get_tasks_page(
+        db, limit=50, search="отчёт клиент"))
+    await bench("get_tasks[tag]", lambda db, _: crud.get_tasks(
+        db, tag=rng.choice(tag_names)))
+    await bench("get_task_rows_page", lambda db, _: crud.get_task_rows_page(db, limit=50))
+    await bench("get_tasks[all]", lambda db, _: crud.get_tasks(db),
+                count=max(1, iterations // 20))
+    await bench("get_task_rows[all]", lambda db, _: crud.get_task_rows(db),
+                count=max(1, iterations // 20))
+    await bench("get_task", lambda db, _: crud.get_task(db, rng.choice(task_ids)))
+    await bench("get_task_payload", lambda db, _: crud.get_task_payload(
+        db, rng.choice(task_ids)))
+    if file_ids:
+        await bench("get_task_file", lambda db, _: crud.get_task_file(
+            db, *rng.choice(file_ids)))
+    await bench("get_stats", lambda db, _: task_stats.get_stats(db))
+    await bench("get_changes", lambda db, _: crud.get_changes(db, None, 500))
+    await bench("stream_tasks", export_all, count=max(1, iterations // 20))
+    await bench("resolve_tags", lambda db, _: crud.resolve_tags(
+        db, rng.sample(tag_names, k=min(10, len(tag_names)))), async_session)
+    await bench("create_task", create, async_session)
+    await bench("create_tasks_bulk[100]", create_bulk, async_session,
+                count=max(1, iterations // 10))
+    await bench("update_task", update, async_session)
+    await bench("update_tasks_batch[500]", update_batch, async_session,
+                count=max(1, iterations // 10))
+    await bench("delete_task", delete, async_session)
+    return results
@@ -0,0 +1,78 @@
+import hashlib
+import os
+import random
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+# Синтетические данные: N задач, M тегов, K файлов (детерминированно по seed)
+
+WORDS = [
+    "отчёт", "выгрузка", "клиент", "сегмент", "метрика", "описание", "поле",
+    "дашборд", "интеграция", "релиз", "тестирование", "доработка", "оплата",
+    "договор", "поставка", "склад", "заявка", "аналитика", "прогноз", "бюджет",
+]
+
+
+def _sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize()
+
+
+async def generate(tasks: int, tags: int, files: int, seed: int = 42) -> Dict[str, List[int]]:
+    from app import crud, schema, schemas, storage
+    from app.database import engine, async_session
+
+    rng = random.Random(seed)
+    await schema.create(engine)
+
+    tag_names = [f"tag-{index}" for index in range(tags)]
+    priorities = list(schemas.Priority)
+    statuses = list(schemas.Status)
+    base = datetime(2025, 1, 1)
+
+    batch_size = 1000
+    async with async_session() as db:
+        for offset in range(0, tasks, batch_size):
+            batch = []
+            for _ in range(min(batch_size, tasks - offset)):
+                start = base + timedelta(days=rng.randint(0, 365))
+                end = start + timedelta(days=rng.randint(1, 60))
+                batch.append(schemas.TaskCreate(
+                    title=_sentence(rng, 3),
+                    description=_sentence(rng, 12),
+                    priority=rng.choice(priorities),
+                    status=rng.choice(statuses),
+                    start_date=start,
+                    end_date=end,
+                    deadline=end + timedelta(days=rng.randint(0, 10)),
+                    tags=rng.sample(tag_names, k=min(len(tag_names), rng.randint(0, 3))),
+                ))
+            await crud.create_tasks_bulk(db, batch)
+
+        # Файлы: содержимое сразу кладём в хранилище блобов, часть дублируется
+        task_ids = list(range(1, tasks + 1))
+        per_task: Dict[int, List] = {}
+        contents = []
+        for index in range(files):
+            if contents and rng.random() < 0.3:
+                data = rng.choice(contents)
+            else:
+                data = os.urandom(rng.randint(4, 64) * 1024)
+                contents.append(data)
+            sha256 = hashlib.sha256(data).hexdigest()
+            path = storage.blob_path(sha256)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as out:
+                out.write(data)
+            upload = storage.StoredUpload(path=path, size=len(data), sha256=sha256)
+            per_task.setdefault(rng.choice(task_ids), []).append(
+                (f"file-{index}.bin", upload))
+        file_ids = []
+        for task_id, uploads in per_task.items():
+            saved = await crud.add_files_to_task(db, task_id, uploads)
+            file_ids.extend((task_id, file.id) for file in saved)
+
+    return {
+        "task_ids": list(range(1, tasks + 1)),
+        "tag_names": tag_names,
+        "file_ids": file_ids,
+    }
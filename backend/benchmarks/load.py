@@ -0,0 +1,87 @@
+import asyncio
+import itertools
+import os
+import random
+import time
+from typing import Callable, Dict, List, Tuple
+from .stats import Timer, summarize
+
+# Нагрузочный тест API /tasks через ASGI-приложение в том же процессе
+
+
+def _scenarios(data: dict, rng: random.Random) -> List[Tuple[str, Callable[[int], dict]]]:
+    from app import schemas
+
+    task_ids = data["task_ids"]
+    tag_names = data["tag_names"]
+    file_ids = data["file_ids"]
+    statuses = [status.value for status in schemas.Status]
+    priorities = [priority.value for priority in schemas.Priority]
+
+    def list_tasks(params: Callable[[], dict]) -> Callable[[int], dict]:
+        return lambda _: {"method": "GET", "url": "/tasks/", "params": params()}
+
+    scenarios = [
+        ("GET /tasks/", list_tasks(lambda: {})),
+        ("GET /tasks/?priority", list_tasks(lambda: {"priority": rng.choice(priorities)})),
+        ("GET /tasks/?status", list_tasks(lambda: {"status": rng.choice(statuses)})),
+        ("GET /tasks/?tag", list_tasks(lambda: {"tag": rng.choice(tag_names)})),
+        ("GET /tasks/?search", list_tasks(lambda: {"search": "клиент"})),
+        ("GET /tasks/?start_date range", list_tasks(lambda: {
+            "start_date_after": "2025-03-01T00:00:00",
+            "start_date_before": "2025-04-01T00:00:00"})),
+        ("GET /tasks/?deadline_before", list_tasks(lambda: {
+            "deadline_before": "2025-02-01T00:00:00"})),
+        ("GET /tasks/?status&tag", list_tasks(lambda: {
+            "status": rng.choice(statuses), "tag": rng.choice(tag_names)})),
+        ("GET /tasks/?priority&search", list_tasks(lambda: {
+            "priority": rng.choice(priorities), "search": "отчёт"})),
+        ("GET /tasks/?all&status", list_tasks(lambda: {
+            "all": "true", "status": rng.choice(statuses)})),
+        ("GET /tasks/{id}", lambda _: {
+            "method": "GET", "url": f"/tasks/{rng.choice(task_ids)}"}),
+        ("POST /tasks/ (multipart)", lambda index: {
+            "method": "POST", "url": "/tasks/",
+            "data": {"title": f"Нагрузка {index}", "description": "multipart",
+                     "tags": rng.sample(tag_names, k=min(2, len(tag_names)))},
+            "files": [("files", (f"load-{index}.bin", os.urandom(16 * 1024)))]}),
+        ("POST /tasks/{id}/files", lambda index: {
+            "method": "POST", "url": f"/tasks/{rng.choice(task_ids)}/files",
+            "files": [("files", (f"upload-{index}-{time.monotonic_ns()}.bin",
+                                 os.urandom(256 * 1024)))]}),
+    ]
+    if file_ids:
+        scenarios.append(("GET /tasks/{id}/files/{file_id}/download", lambda _: {
+            "method": "GET",
+            "url": "/tasks/{}/files/{}/download".format(*rng.choice(file_ids))}))
+    return scenarios
+
+
+async def run(data: dict, requests: int, concurrency: int, seed: int = 42) -> Dict[str, dict]:
+    import httpx
+    from app.main import app
+
+    rng = random.Random(seed)
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for name, make_request in _scenarios(data, rng):
+            counter = itertools.count()
+            latencies = []
+            errors = 0
+
+            async def worker():
+                nonlocal errors
+                while (index := next(counter)) < requests:
+                    request = make_request(index)
+                    started = time.perf_counter()
+                    response = await client.request(**request)
+                    await response.aread()
+                    latencies.append(time.perf_counter() - started)
+                    if response.status_code >= 400:
+                        errors += 1
+
+            with Timer() as total:
+                await asyncio.gather(*(worker() for _ in range(concurrency)))
+            results[f"http.{name}"] = summarize(latencies, total.elapsed, errors)
+    return results
@@ -0,0 +1,101 @@
+import itertools
+import re
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+# EXPLAIN QUERY PLAN для каждой комбинации фильтров списка задач (SQLite).
+# Полный проход по таблице считается регрессией: «SCAN tasks» без индекса,
+# а при фильтрах и «SCAN tasks USING INDEX» — проход по всему индексу
+# читает те же строки. Без фильтров обход индекса по порядку — норма.
+#   python -m benchmarks plans
+
+_FULL_SCAN_RE = re.compile(r"^SCAN (\w+)\b(?! USING (COVERING )?INDEX| VIRTUAL TABLE)")
+_INDEX_SCAN_RE = re.compile(r"^SCAN (\w+)\b(?! VIRTUAL TABLE)")
+
+
+def _filter_values() -> Dict[str, object]:
+    from app import schemas
+
+    moment = datetime(2025, 6, 1)
+    return {
+        "priority": schemas.Priority.HIGH,
+        "status": schemas.Status.IN_PROGRESS,
+        "start_date_before": moment,
+        "start_date_after": moment,
+        "end_date_before": moment,
+        "end_date_after": moment,
+        "deadline_before": moment,
+        "deadline_after": moment,
+        "search": "отчёт",
+        "tag": "tag-1",
+        "search_files": True,
+    }
+
+
+def _queries():
+    from sqlalchemy import select
+    from app import crud, deadlines
+
+    values = _filter_values()
+    cursor = crud.encode_cursor(datetime(2025, 6, 1), 1000)
+    # Страницы поиска листаются курсором по рангу
+    rank_cursor = crud.encode_cursor(-1.5, 1000)
+    names = sorted(values)
+    for size in range(len(names) + 1):
+        for combination in itertools.combinations(names, size):
+            filters = {name: values[name] for name in combination}
+            label = "+".join(combination) or "no filters"
+            # search_files без search ничего не фильтрует
+            filtered = bool(set(combination) - {"search_files"})
+            yield f"page[{label}]", filtered, crud._page_query(
+                select(*crud.TASK_COLUMNS), 50, None, **filters)
+            yield f"page+cursor[{label}]", filtered, crud._page_query(
+                select(*crud.TASK_COLUMNS), 50,
+                rank_cursor if "search" in filters else cursor, **filters)
+            yield f"all[{label}]", filtered, crud._list_query(
+                select(*crud.TASK_COLUMNS), **filters)
+            yield f"export[{label}]", filtered, crud._export_query(**filters)
+
+    ids = list(range(1, 51))
+    yield "page files", True, crud._files_query(ids)
+    yield "page tags", True, crud._tags_query(ids)
+    # Частичный индекс ix_tasks_open_deadline сам и есть фильтр: обходится целиком
+    yield "open deadlines", False, deadlines.open_deadlines_query()
+
+
+def full_scans(plan: List[str], filtered: bool = True) -> List[str]:
+    from app.database import Base
+
+    # Проход по материализованному CTE (search.ranked) — это уже результат
+    # MATCH, а не таблица
+    pattern = _INDEX_SCAN_RE if filtered else _FULL_SCAN_RE
+    scans = []
+    for line in plan:
+        found = pattern.match(line)
+        if found and found.group(1) in Base.metadata.tables:
+            scans.append(line)
+    return scans
+
+
+def check() -> List[Tuple[str, bool, List[str]]]:
+    from sqlalchemy import create_engine, event
+    from app.database import Base
+    from app import models  # noqa: F401  регистрирует таблицы в Base.metadata
+
+    # Планы строятся на пустой схеме из моделей: без ANALYZE SQLite выбирает
+    # индексы по структуре запроса, поэтому результат воспроизводим
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+
+    def explain(conn, cursor, statement, parameters, context, executemany):
+        return "EXPLAIN QUERY PLAN " + statement, parameters
+
+    failures = []
+    with engine.connect() as conn:
+        event.listen(conn, "before_cursor_execute", explain, retval=True)
+        for name, filtered, query in _queries():
+            plan = [row[3] for row in conn.execute(query).cursor.fetchall()]
+            if full_scans(plan, filtered):
+                failures.append((name, filtered, plan))
+    engine.dispose()
+    return failures
@@ -0,0 +1,28 @@
+"""add task version
+
+Revision ID: 0c6e2f9a4b17
+Revises: f5a1d3c8e6b2
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0c6e2f9a4b17'
+down_revision: Union[str, None] = 'f5a1d3c8e6b2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # server_default заполняет существующие строки, NOT NULL сразу
+    op.add_column('tasks', sa.Column('version', sa.Integer(), nullable=False, server_default='1'))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('tasks') as batch_op:
+        batch_op.drop_column('version')
@@ -0,0 +1,28 @@
+"""add tasks created_at id index
+
+Revision ID: 3f1a9c2d7b04
+Revises: c55ff3799765
+Create Date: 2026-10-18 10:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f1a9c2d7b04'
+down_revision: Union[str, None] = 'c55ff3799765'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Индекс под keyset-пагинацию GET /tasks/
+    op.create_index('ix_tasks_created_at_id', 'tasks',
+                    ['created_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_tasks_created_at_id', table_name='tasks')
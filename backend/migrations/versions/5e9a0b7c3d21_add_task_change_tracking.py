@@ -0,0 +1,39 @@
+"""add task change tracking
+
+Revision ID: 5e9a0b7c3d21
+Revises: d4c7e1f08a3b
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e9a0b7c3d21'
+down_revision: Union[str, None] = 'd4c7e1f08a3b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('tasks', sa.Column('updated_at', sa.DateTime(), nullable=True))
+    op.execute("UPDATE tasks SET updated_at = created_at")
+    op.create_index('ix_tasks_updated_at_id', 'tasks', ['updated_at', 'id'])
+
+    op.create_table(
+        'task_tombstones',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('task_id', sa.Integer(), nullable=False),
+        sa.Column('deleted_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('task_tombstones')
+    op.drop_index('ix_tasks_updated_at_id', table_name='tasks')
+    with op.batch_alter_table('tasks') as batch_op:
+        batch_op.drop_column('updated_at')
@@ -0,0 +1,29 @@
+"""add task file encoding
+
+Revision ID: 7d3b1e5c9a20
+Revises: 0c6e2f9a4b17
+Create Date: 2026-10-18 20:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7d3b1e5c9a20'
+down_revision: Union[str, None] = '0c6e2f9a4b17'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # NULL — файл хранится как есть, что верно для всех существующих вложений
+    op.add_column('task_files', sa.Column('encoding', sa.String(16), nullable=True))
+
+
+def downgrade() -> None:
+    # Сжатые блобы после отката не читаются: распакуйте их до downgrade
+    with op.batch_alter_table('task_files') as batch_op:
+        batch_op.drop_column('encoding')
@@ -0,0 +1,44 @@
+"""add tasks full-text index
+
+Revision ID: 8b2e5d41c9a7
+Revises: 3f1a9c2d7b04
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8b2e5d41c9a7'
+down_revision: Union[str, None] = '3f1a9c2d7b04'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+
+    op.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS tasks_fts USING fts5(
+            title, description, tokenize='unicode61 remove_diacritics 2'
+        )
+    """)
+    # Заполняем индекс существующими задачами (ё -> е, как в app/search.py)
+    op.execute("""
+        INSERT INTO tasks_fts (rowid, title, description)
+        SELECT id,
+               replace(replace(coalesce(title, ''), 'ё', 'е'), 'Ё', 'Е'),
+               replace(replace(coalesce(description, ''), 'ё', 'е'), 'Ё', 'Е')
+        FROM tasks
+    """)
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+
+    op.execute("DROP TABLE IF EXISTS tasks_fts")
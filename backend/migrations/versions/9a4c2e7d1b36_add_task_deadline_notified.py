@@ -0,0 +1,28 @@
+"""add task deadline notified
+
+Revision ID: 9a4c2e7d1b36
+Revises: 7d3b1e5c9a20
+Create Date: 2026-10-18 22:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9a4c2e7d1b36'
+down_revision: Union[str, None] = '7d3b1e5c9a20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # NULL: по открытым срокам уведомления ещё не отправлялись
+    op.add_column('tasks', sa.Column('deadline_notified', sa.String(32), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('tasks') as batch_op:
+        batch_op.drop_column('deadline_notified')
@@ -0,0 +1,72 @@
+"""add task stats
+
+Revision ID: a71f3c9e2b58
+Revises: 5e9a0b7c3d21
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from collections import Counter
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a71f3c9e2b58'
+down_revision: Union[str, None] = '5e9a0b7c3d21'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Enum хранится в БД по имени, в счётчиках — по значению (как в app/stats.py)
+STATUSES = {
+    'CREATED': 'Создано',
+    'IN_PROGRESS': 'В работе',
+    'TESTING': 'Тестирование',
+    'REVISION': 'На доработке',
+    'UPDATE': 'К обновлению',
+    'DONE': 'Выполнено',
+}
+PRIORITIES = {
+    'LOW': 'Низкий',
+    'MEDIUM': 'Средний',
+    'HIGH': 'Высокий',
+}
+
+
+def upgrade() -> None:
+    task_stats = op.create_table(
+        'task_stats',
+        sa.Column('dimension', sa.String(), nullable=False),
+        sa.Column('key', sa.String(), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('dimension', 'key')
+    )
+
+    conn = op.get_bind()
+    counts = Counter()
+    for status, count in conn.execute(sa.text(
+            "SELECT status, COUNT(*) FROM tasks WHERE status IS NOT NULL GROUP BY status")):
+        counts['status', STATUSES[status]] += count
+    for priority, count in conn.execute(sa.text(
+            "SELECT priority, COUNT(*) FROM tasks WHERE priority IS NOT NULL GROUP BY priority")):
+        counts['priority', PRIORITIES[priority]] += count
+    for name, count in conn.execute(sa.text(
+            "SELECT tags.name, COUNT(*) FROM task_tags "
+            "JOIN tags ON tags.id = task_tags.tag_id GROUP BY tags.name")):
+        counts['tag', name] += count
+    for day, count in conn.execute(sa.text(
+            "SELECT date(deadline), COUNT(*) FROM tasks "
+            "WHERE deadline IS NOT NULL AND (status IS NULL OR status != 'DONE') "
+            "GROUP BY date(deadline)")):
+        counts['deadline', day if isinstance(day, str) else day.isoformat()] += count
+
+    if counts:
+        op.bulk_insert(task_stats, [
+            {'dimension': dimension, 'key': key, 'count': count}
+            for (dimension, key), count in counts.items()
+        ])
+
+
+def downgrade() -> None:
+    op.drop_table('task_stats')
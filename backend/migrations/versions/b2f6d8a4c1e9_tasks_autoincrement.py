@@ -0,0 +1,46 @@
+"""tasks autoincrement
+
+Revision ID: b2f6d8a4c1e9
+Revises: 9a4c2e7d1b36
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b2f6d8a4c1e9'
+down_revision: Union[str, None] = '9a4c2e7d1b36'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Без AUTOINCREMENT SQLite отдаёт id удалённой задачи следующей вставке.
+    # В PostgreSQL последовательности номера не повторяют
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    with op.batch_alter_table(
+            'tasks', recreate='always',
+            table_kwargs={'sqlite_autoincrement': True}) as batch_op:
+        pass
+    # Счётчик продолжается за всеми когда-либо выданными id, включая
+    # удалённые задачи, по которым остались надгробия
+    op.execute("DELETE FROM sqlite_sequence WHERE name = 'tasks'")
+    op.execute(
+        "INSERT INTO sqlite_sequence (name, seq) SELECT 'tasks', MAX("
+        "COALESCE((SELECT MAX(id) FROM tasks), 0), "
+        "COALESCE((SELECT MAX(task_id) FROM task_tombstones), 0))"
+    )
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    with op.batch_alter_table(
+            'tasks', recreate='always',
+            table_kwargs={'sqlite_autoincrement': False}) as batch_op:
+        pass
@@ -0,0 +1,55 @@
+"""add file jobs
+
+Revision ID: b9c4e7a2d15f
+Revises: e2d8b6f41a90
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b9c4e7a2d15f'
+down_revision: Union[str, None] = 'e2d8b6f41a90'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('task_files') as batch_op:
+        batch_op.add_column(sa.Column('processing_status', sa.String(), nullable=True))
+        batch_op.add_column(sa.Column('preview', sa.String(), nullable=True))
+
+    op.create_table(
+        'file_jobs',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('task_file_id', sa.Integer(), nullable=False),
+        sa.Column('status', sa.String(), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('error', sa.String(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['task_file_id'], ['task_files.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_file_jobs_task_file_id', 'file_jobs', ['task_file_id'])
+    op.create_index('ix_file_jobs_status_id', 'file_jobs', ['status', 'id'])
+
+    # Уже загруженные файлы тоже ставим в очередь
+    op.execute(
+        "INSERT INTO file_jobs (task_file_id, status, attempts, created_at, updated_at) "
+        "SELECT id, 'pending', 0, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP FROM task_files"
+    )
+    op.execute("UPDATE task_files SET processing_status = 'pending'")
+
+
+def downgrade() -> None:
+    op.drop_index('ix_file_jobs_status_id', table_name='file_jobs')
+    op.drop_index('ix_file_jobs_task_file_id', table_name='file_jobs')
+    op.drop_table('file_jobs')
+    with op.batch_alter_table('task_files') as batch_op:
+        batch_op.drop_column('preview')
+        batch_op.drop_column('processing_status')
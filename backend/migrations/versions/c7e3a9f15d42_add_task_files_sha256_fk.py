@@ -0,0 +1,31 @@
+"""add task_files.sha256 foreign key
+
+Revision ID: c7e3a9f15d42
+Revises: b2f6d8a4c1e9
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c7e3a9f15d42'
+down_revision: Union[str, None] = 'b2f6d8a4c1e9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # d4c7e1f08a3b добавил колонку без ссылки на file_blobs. SQLite не умеет
+    # ALTER TABLE ... ADD CONSTRAINT: batch пересоздаёт task_files
+    with op.batch_alter_table('task_files') as batch_op:
+        batch_op.create_foreign_key(
+            'fk_task_files_sha256_file_blobs', 'file_blobs', ['sha256'], ['sha256'])
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('task_files') as batch_op:
+        batch_op.drop_constraint('fk_task_files_sha256_file_blobs', type_='foreignkey')
@@ -0,0 +1,112 @@
+"""add content-addressed file blobs
+
+Revision ID: d4c7e1f08a3b
+Revises: 8b2e5d41c9a7
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+import hashlib
+import os
+import shutil
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.config import settings
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4c7e1f08a3b'
+down_revision: Union[str, None] = '8b2e5d41c9a7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BLOB_DIR = os.path.join(settings.upload_dir, 'blobs')
+
+
+def _blob_path(sha256: str) -> str:
+    return os.path.join(BLOB_DIR, sha256[:2], sha256[2:])
+
+
+def _hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as source:
+        for chunk in iter(lambda: source.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _remove_after_commit(bind, paths) -> None:
+    # Alembic выполняет все миграции одной транзакцией: файлы удаляются,
+    # только когда она зафиксирована, при откате они остаются на месте
+    def remove(conn):
+        for path in paths:
+            if os.path.isfile(path):
+                os.remove(path)
+    sa.event.listen(bind, 'commit', remove, once=True)
+
+
+def upgrade() -> None:
+    op.create_table(
+        'file_blobs',
+        sa.Column('sha256', sa.String(length=64), nullable=False),
+        sa.Column('size', sa.Integer(), nullable=True),
+        sa.Column('refcount', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('sha256')
+    )
+    op.add_column('task_files', sa.Column(
+        'sha256', sa.String(length=64), nullable=True))
+    op.create_index('ix_task_files_sha256', 'task_files', ['sha256'])
+
+    # Переносим существующие вложения в хранилище по хешу:
+    # одинаковые файлы остаются на диске в одном экземпляре
+    bind = op.get_bind()
+    rows = bind.execute(sa.text(
+        "SELECT id, file_path FROM task_files WHERE sha256 IS NULL")).fetchall()
+    blobs = {}
+    originals = []
+    for file_id, file_path in rows:
+        if not file_path or not os.path.isfile(file_path):
+            continue
+        sha256 = _hash_file(file_path)
+        if sha256 not in blobs:
+            os.makedirs(os.path.dirname(_blob_path(sha256)), exist_ok=True)
+            shutil.copyfile(file_path, _blob_path(sha256))
+            blobs[sha256] = [os.path.getsize(file_path), 0]
+        blobs[sha256][1] += 1
+        bind.execute(
+            sa.text("UPDATE task_files SET sha256 = :sha256 WHERE id = :id"),
+            {"sha256": sha256, "id": file_id}
+        )
+        originals.append(file_path)
+
+    for sha256, (size, refcount) in blobs.items():
+        bind.execute(
+            sa.text(
+                "INSERT INTO file_blobs (sha256, size, refcount, created_at) "
+                "VALUES (:sha256, :size, :refcount, CURRENT_TIMESTAMP)"
+            ),
+            {"sha256": sha256, "size": size, "refcount": refcount}
+        )
+    _remove_after_commit(bind, originals)
+
+
+def downgrade() -> None:
+    # Возвращаем каждому вложению собственную копию по file_path
+    bind = op.get_bind()
+    rows = bind.execute(sa.text(
+        "SELECT file_path, sha256 FROM task_files WHERE sha256 IS NOT NULL")).fetchall()
+    for file_path, sha256 in rows:
+        if os.path.isfile(_blob_path(sha256)):
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            shutil.copyfile(_blob_path(sha256), file_path)
+    _remove_after_commit(bind, [
+        _blob_path(sha256)
+        for sha256, in bind.execute(sa.text("SELECT sha256 FROM file_blobs")).fetchall()])
+
+    op.drop_index('ix_task_files_sha256', table_name='task_files')
+    with op.batch_alter_table('task_files') as batch_op:
+        batch_op.drop_column('sha256')
+    op.drop_table('file_blobs')
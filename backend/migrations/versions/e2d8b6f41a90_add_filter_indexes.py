@@ -0,0 +1,78 @@
+"""add filter indexes
+
+Revision ID: e2d8b6f41a90
+Revises: a71f3c9e2b58
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2d8b6f41a90'
+down_revision: Union[str, None] = 'a71f3c9e2b58'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Частичные индексы: (имя, колонка, условие)
+PARTIAL_INDEXES = [
+    ('ix_tasks_start_date', 'start_date', 'start_date IS NOT NULL'),
+    ('ix_tasks_end_date', 'end_date', 'end_date IS NOT NULL'),
+    ('ix_tasks_deadline', 'deadline', 'deadline IS NOT NULL'),
+    ('ix_tasks_open_deadline', 'deadline', "deadline IS NOT NULL AND status != 'DONE'"),
+]
+
+
+def upgrade() -> None:
+    # task_tags пересоздаётся с первичным ключом (task_id, tag_id); дубли
+    # связей и строки с NULL отбрасываются при копировании
+    op.create_table(
+        '_task_tags_new',
+        sa.Column('task_id', sa.Integer(), sa.ForeignKey('tasks.id'), nullable=False),
+        sa.Column('tag_id', sa.Integer(), sa.ForeignKey('tags.id'), nullable=False),
+        sa.PrimaryKeyConstraint('task_id', 'tag_id')
+    )
+    op.execute(
+        "INSERT INTO _task_tags_new (task_id, tag_id) "
+        "SELECT DISTINCT task_id, tag_id FROM task_tags "
+        "WHERE task_id IS NOT NULL AND tag_id IS NOT NULL"
+    )
+    op.drop_table('task_tags')
+    op.rename_table('_task_tags_new', 'task_tags')
+    op.create_index('ix_task_tags_tag_id_task_id', 'task_tags', ['tag_id', 'task_id'])
+
+    # Счётчики тегов в task_stats могли учитывать удалённые дубли
+    op.execute("DELETE FROM task_stats WHERE dimension = 'tag'")
+    op.execute(
+        "INSERT INTO task_stats (dimension, key, count) "
+        "SELECT 'tag', tags.name, COUNT(*) FROM task_tags "
+        "JOIN tags ON tags.id = task_tags.tag_id GROUP BY tags.name"
+    )
+
+    op.create_index('ix_task_files_task_id', 'task_files', ['task_id'])
+    op.create_index('ix_tasks_status_created_at_id', 'tasks', ['status', 'created_at', 'id'])
+    op.create_index('ix_tasks_priority_created_at_id', 'tasks', ['priority', 'created_at', 'id'])
+    for name, column, where in PARTIAL_INDEXES:
+        op.create_index(name, 'tasks', [column],
+                        sqlite_where=sa.text(where), postgresql_where=sa.text(where))
+
+
+def downgrade() -> None:
+    for name, _, _ in reversed(PARTIAL_INDEXES):
+        op.drop_index(name, table_name='tasks')
+    op.drop_index('ix_tasks_priority_created_at_id', table_name='tasks')
+    op.drop_index('ix_tasks_status_created_at_id', table_name='tasks')
+    op.drop_index('ix_task_files_task_id', table_name='task_files')
+
+    op.drop_index('ix_task_tags_tag_id_task_id', table_name='task_tags')
+    op.create_table(
+        '_task_tags_old',
+        sa.Column('task_id', sa.Integer(), sa.ForeignKey('tasks.id')),
+        sa.Column('tag_id', sa.Integer(), sa.ForeignKey('tags.id'))
+    )
+    op.execute("INSERT INTO _task_tags_old (task_id, tag_id) SELECT task_id, tag_id FROM task_tags")
+    op.drop_table('task_tags')
+    op.rename_table('_task_tags_old', 'task_tags')
@@ -0,0 +1,59 @@
+"""add file chunks
+
+Revision ID: f5a1d3c8e6b2
+Revises: b9c4e7a2d15f
+Create Date: 2026-10-18 17:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f5a1d3c8e6b2'
+down_revision: Union[str, None] = 'b9c4e7a2d15f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'file_chunks',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('task_file_id', sa.Integer(), nullable=False),
+        sa.Column('task_id', sa.Integer(), nullable=False),
+        sa.Column('position', sa.Integer(), nullable=False),
+        sa.Column('content', sa.String(), nullable=False),
+        sa.ForeignKeyConstraint(['task_file_id'], ['task_files.id']),
+        sa.ForeignKeyConstraint(['task_id'], ['tasks.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_file_chunks_task_file_id', 'file_chunks', ['task_file_id'])
+    op.create_index('ix_file_chunks_task_id', 'file_chunks', ['task_id'])
+
+    if op.get_bind().dialect.name == 'sqlite':
+        op.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS file_chunks_fts USING fts5(
+                content, tokenize='unicode61 remove_diacritics 2'
+            )
+        """)
+
+    # Текст уже обработанных файлов извлекается заново фоновой очередью
+    op.execute(
+        "UPDATE file_jobs SET status = 'pending', attempts = 0, error = NULL "
+        "WHERE status = 'done'"
+    )
+    op.execute(
+        "UPDATE task_files SET processing_status = 'pending' "
+        "WHERE processing_status = 'done'"
+    )
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == 'sqlite':
+        op.execute("DROP TABLE IF EXISTS file_chunks_fts")
+    op.drop_index('ix_file_chunks_task_id', table_name='file_chunks')
+    op.drop_index('ix_file_chunks_task_file_id', table_name='file_chunks')
+    op.drop_table('file_chunks')